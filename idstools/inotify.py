@@ -0,0 +1,168 @@
+# Copyright (c) 2013 Jason Ish
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+""" Module for watching files and directories with Linux inotify.
+
+Only the small part of the inotify API needed to wait for changes is
+provided, using ctypes so no extension module is required.  Use
+:func:`.is_available` to check for support before creating an
+:class:`.Inotify`.
+
+"""
+
+import os
+import sys
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# Event masks, from <sys/inotify.h>.
+IN_ACCESS        = 0x00000001
+IN_MODIFY        = 0x00000002
+IN_ATTRIB        = 0x00000004
+IN_CLOSE_WRITE   = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN          = 0x00000020
+IN_MOVED_FROM    = 0x00000040
+IN_MOVED_TO      = 0x00000080
+IN_CREATE        = 0x00000100
+IN_DELETE        = 0x00000200
+IN_DELETE_SELF   = 0x00000400
+IN_MOVE_SELF     = 0x00000800
+IN_Q_OVERFLOW    = 0x00004000
+IN_IGNORED       = 0x00008000
+
+# Flags for inotify_init1.
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC  = 0o2000000
+
+# The fixed part of struct inotify_event: watch descriptor, mask,
+# cookie and name length.
+EVENT_STRUCT = struct.Struct("iIII")
+
+# Enough to read many events at once.
+READ_SIZE = 64 * 1024
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify requires Linux")
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify not supported by libc")
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc = libc
+    return _libc
+
+def is_available():
+    """Return True if inotify can be used on this system."""
+    try:
+        _load_libc()
+        return True
+    except OSError:
+        return False
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+class Inotify(object):
+    """An inotify instance.
+
+    Raises :exc:`OSError` if inotify is not available or the instance
+    can't be created.
+
+    Example::
+
+        watcher = inotify.Inotify()
+        watcher.add_watch("/var/log/snort", inotify.IN_MODIFY)
+        for wd, mask, cookie, name in watcher.read_events(timeout=1):
+            print(name)
+
+    """
+
+    def __init__(self):
+        self.libc = _load_libc()
+        self.fd = _check(self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        """Watch path for the events in mask, returning the watch
+        descriptor."""
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+        return _check(self.libc.inotify_add_watch(self.fd, path, mask))
+
+    def rm_watch(self, wd):
+        """Remove a watch by its watch descriptor."""
+        _check(self.libc.inotify_rm_watch(self.fd, wd))
+
+    def read_events(self, timeout=None):
+        """Read the pending events, waiting up to timeout seconds for
+        some to arrive, or forever if timeout is None.
+
+        :returns: A list of (watch descriptor, mask, cookie, name)
+          tuples, which is empty if the timeout expired.  The name is
+          bytes, and empty for events on the watched path itself.
+        """
+        try:
+            readable = select.select([self.fd], [], [], timeout)[0]
+        except (select.error, OSError) as err:
+            if err.args[0] == errno.EINTR:
+                return []
+            raise
+        if not readable:
+            return []
+        try:
+            buf = os.read(self.fd, READ_SIZE)
+        except OSError as err:
+            if err.errno in (errno.EAGAIN, errno.EINTR):
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + EVENT_STRUCT.size <= len(buf):
+            wd, mask, cookie, length = EVENT_STRUCT.unpack_from(buf, offset)
+            offset += EVENT_STRUCT.size
+            name = buf[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
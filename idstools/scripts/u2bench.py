@@ -9,6 +9,11 @@ import os
 import time
 import getopt
 
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
 sys.path.insert(
     0, os.path.dirname(os.path.dirname(os.path.abspath(sys.argv[0]))))
 
@@ -20,45 +25,85 @@ usage: %s [options] <filenames>
 
 options:
 
-    no options yet
+    -b, --buffered      read records in blocks with a buffered reader
+    -c, --compact       decode into the compact record types
+    -m, --memory        compare the memory used to hold all events as
+                        dict based and compact records
 """ % (sys.argv[0]))
 
+def measure_event_memory(filenames, decoders):
+    """Return the number of events in the files and the memory in
+    bytes used to hold them all."""
+    tracemalloc.start()
+    try:
+        events = list(unified2.FileEventReader(*filenames, decoders=decoders))
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return len(events), size
+
+def report_memory(filenames):
+    if tracemalloc is None:
+        print("error: memory comparison requires tracemalloc", file=sys.stderr)
+        return 1
+    for name, decoders in [("dict", unified2.DECODERS),
+                           ("compact", unified2.COMPACT_DECODERS)]:
+        count, size = measure_event_memory(filenames, decoders)
+        print("Memory (%s): Events: %d; Bytes: %d; Bytes/event: %d" % (
+            name, count, size, size / max(count, 1)))
+    return 0
+
 def main():
 
     try:
         opts, args = getopt.getopt(
-            sys.argv[1:], "h", 
-            ["help"])
+            sys.argv[1:], "hbcm",
+            ["help", "buffered", "compact", "memory"])
     except getopt.GetoptError as err:
         print("error: invalid command line: %s" % err, file=sys.stderr)
         usage()
         return 1
+    buffer_size = None
+    decoders = None
+    memory = False
+
     for o, a in opts:
         if o in ["-h", "--help"]:
             usage(sys.stdout)
             return 0
+        elif o in ["-b", "--buffered"]:
+            buffer_size = unified2.BUFFER_SIZE
+        elif o in ["-c", "--compact"]:
+            decoders = unified2.COMPACT_DECODERS
+        elif o in ["-m", "--memory"]:
+            memory = True
 
     if not args:
         print("error: nothing to do", file=sys.stderr)
         usage()
         return 1
 
+    if memory:
+        return report_memory(args)
+
     record_count = 0
     start_time = time.time()
 
     for arg in args:
         print("Processing file %s." % arg)
 
-        with open(arg) as fileobj:
-            while 1:
-                record = unified2.read_record(fileobj)
-                if not record:
-                    break
+        with open(arg, "rb") as fileobj:
+            reader = unified2.RecordReader(
+                fileobj, buffer_size=buffer_size, decoders=decoders)
+            for record in reader:
                 record_count += 1
 
     elapsed_time = time.time() - start_time
-    print("Records: %d; Time: %d; Records/sec: %d" % (
-        record_count, elapsed_time, record_count / int(elapsed_time)))
+    print("Records: %d; Time: %.3f; Records/sec: %d" % (
+        record_count, elapsed_time, record_count / max(elapsed_time, 0.001)))
+    cache = unified2.ADDRESS_CACHE
+    print("Address cache: Hits: %d; Misses: %d; Hit rate: %.3f" % (
+        cache.hits, cache.misses, cache.hit_rate()))
 
 if __name__ == "__main__":
     sys.exit(main())
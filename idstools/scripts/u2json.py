@@ -32,8 +32,11 @@
     usage: u2json [-h] [-C <classification.config>] [-S <msg-msg.map>]
                   [-G <gen-msg.map>] [--snort-conf <snort.conf>]
                   [--directory <spool directory>] [--prefix <spool file prefix>]
-                  [--bookmark] [--follow] [--delete] [--output <filename>]
-                  [--stdout]
+                  [--bookmark] [--bookmark-interval <seconds>] [--follow]
+                  [--delete] [--archive <directory>] [--compress]
+                  [--prefetch <records>] [--output <filename>] [--stdout]
+                  [--workers <count>] [--utc] [--flush-bytes <bytes>]
+                  [--flush-events <count>] [--flush-interval <seconds>]
                   [filenames [filenames ...]]
 
     positional arguments:
@@ -49,18 +52,52 @@
                             attempt to load classifications and map files based on
                             the location of the snort.conf
       --directory <spool directory>
-                            spool directory (eg: /var/log/snort)
+                            spool directory (eg: /var/log/snort), may be given
+                            more than once
       --prefix <spool file prefix>
-                            spool filename prefix (eg: unified2.log)
+                            spool filename prefix (eg: unified2.log), one for
+                            all directories or one per directory
       --bookmark            enable bookmarking
+      --bookmark-interval <seconds>
+                            write the bookmark at most every this many
+                            seconds instead of after every event
       --follow              follow files/continuous mode (spool mode only)
       --delete              delete spool files
-      --output <filename>   output filename (eg: /var/log/snort/alerts.json
+      --archive <directory>
+                            move spool files to this directory once read
+                            instead of deleting them
+      --compress            gzip compress archived spool files
+      --prefetch <records>  read up to this many records ahead on a
+                            background thread
+      --output <filename>   output filename (eg: /var/log/snort/alerts.json),
+                            or unix:<path>, unixgram:<path> or
+                            tcp:<host>:<port> to send to a socket
       --stdout              also log to stdout if --output is a file
+      --workers <count>     encode events in this many processes
+      --utc                 render timestamps in UTC instead of local time
+      --flush-bytes <bytes>
+                            write output once this many bytes are buffered
+                            (default: 65536)
+      --flush-events <count>
+                            write output once this many events are buffered
+      --flush-interval <seconds>
+                            write output once an event has been buffered
+                            this long (default: 0.5)
 
     If --directory and --prefix are provided files will be read from
     the specified 'spool' directory. Otherwise files on the command
-    line will be processed.
+    line will be processed.  If more than one --directory is given,
+    the events of all the spools are merged by time.
+
+    Output is buffered, and written whenever reading catches up or a
+    --flush-* limit is reached.  Bookmarks only move past events once
+    they have been written.  The output file is reopened if it is
+    renamed or removed, or on SIGHUP.
+
+    --output can also send to a log shipper over a Unix or TCP socket.
+    Failed sends are retried, reconnecting with backoff, and reading
+    waits for them, so events are not dropped when the sink is slow
+    or down.
 
 An alternative to using command line arguments is to put the arguments
 in a file and call u2json like::
@@ -92,10 +129,15 @@ if sys.argv[0] == __file__:
         0, os.path.abspath(os.path.join(__file__, "..", "..", "..")))
 
 import socket
+import select
+import errno
+import signal
+import collections
+import multiprocessing
 import time
+import calendar
 import json
 import logging
-from datetime import datetime
 try:
     from collections import OrderedDict
 except ImportError as err:
@@ -118,30 +160,70 @@ proto_map = {
     17: "UDP",
 }
 
+def format_tzoffset(offset):
+    """Format an offset from UTC in seconds as +HHMM or -HHMM."""
+    sign = "-" if offset < 0 else "+"
+    offset = abs(offset)
+    return "%s%02d%02d" % (sign, offset // 3600, offset % 3600 // 60)
+
 def get_tzoffset(sec):
-    offset = datetime.fromtimestamp(sec) - datetime.utcfromtimestamp(sec)
-    if offset.days == -1:
-        return "-%02d%02d" % (
-            (86400 - offset.seconds) / 3600, (86400 - offset.seconds) % 3600)
-    else:
-        return "+%02d%02d" % (
-            offset.seconds / 3600, offset.seconds % 3600)
+    return format_tzoffset(calendar.timegm(time.localtime(sec)) - int(sec))
+
+class TimestampFormatter(object):
+    """Renders event timestamps as ISO 8601 in local time, or in UTC
+    if *utc* is True.
+
+    Events come in bursts within the same second, so the rendering of
+    the date, time and UTC offset of the last second seen is kept and
+    only the microseconds are rendered for each event.  The cache is
+    keyed by the second itself, so daylight saving changes are picked
+    up as soon as they take effect.
+    """
+
+    def __init__(self, utc=False):
+        self.utc = utc
+        self.second = None
+        self.prefix = None
+        self.suffix = None
+
+    def render(self, sec, usec):
+        if sec != self.second:
+            if self.utc:
+                tt = time.gmtime(sec)
+                self.suffix = "+0000"
+            else:
+                tt = time.localtime(sec)
+                self.suffix = format_tzoffset(calendar.timegm(tt) - int(sec))
+            self.prefix = "%04d-%02d-%02dT%02d:%02d:%02d." % (
+                tt.tm_year, tt.tm_mon, tt.tm_mday, tt.tm_hour, tt.tm_min,
+                tt.tm_sec)
+            self.second = sec
+        return self.prefix + "%06d" % (usec) + self.suffix
+
+TIMESTAMP_FORMATTER = TimestampFormatter()
 
 def render_timestamp(sec, usec):
-    tt = time.localtime(sec)
-    return "%04d-%02d-%02dT%02d:%02d:%02d.%06d%s" % (
-        tt.tm_year, tt.tm_mon, tt.tm_mday, tt.tm_hour, tt.tm_min, tt.tm_sec, 
-        usec, get_tzoffset(sec))
+    return TIMESTAMP_FORMATTER.render(sec, usec)
+
+# The maximum number of rendered alert objects SuricataJsonFilter
+# keeps before starting over.
+ALERT_CACHE_SIZE = 65536
 
 class SuricataJsonFilter(object):
 
-    def __init__(self, msgmap=None, classmap=None):
+    def __init__(self, msgmap=None, classmap=None, timestamp_formatter=None):
         self.msgmap = msgmap
         self.classmap = classmap
+        self.timestamp_formatter = timestamp_formatter or TIMESTAMP_FORMATTER
+
+        # Rendered JSON of the alert object by the event fields it is
+        # made from, and of the proto field by protocol number.
+        self.alerts = {}
+        self.protos = {}
 
     def filter(self, event):
         output = OrderedDict()
-        output["timestamp"] = render_timestamp(
+        output["timestamp"] = self.timestamp_formatter.render(
             event["event-second"], event["event-microsecond"])
         output["event_type"] = "alert"
         output["src_ip"] = event["source-ip"]
@@ -168,6 +250,60 @@ class SuricataJsonFilter(object):
 
         return output
 
+    def encode(self, event):
+        """Return the JSON for event, the same as
+        ``json.dumps(self.filter(event))`` but rendered directly from a
+        template.  The alert object, with the escaped signature message
+        and category, is rendered once for each rule and classification
+        and then reused."""
+        protocol = event["protocol"]
+        timestamp = self.timestamp_formatter.render(
+            event["event-second"], event["event-microsecond"])
+
+        proto = self.protos.get(protocol)
+        if proto is None:
+            proto = self.protos[protocol] = json.dumps(
+                self.getprotobynumber(protocol))
+
+        key = (event["generator-id"], event["signature-id"],
+               event["signature-revision"], event["classification-id"],
+               event["priority"], event["blocked"])
+        alert = self.alerts.get(key)
+        if alert is None:
+            if len(self.alerts) >= ALERT_CACHE_SIZE:
+                self.alerts.clear()
+            alert = self.alerts[key] = self.render_alert(event)
+
+        if protocol == socket.IPPROTO_TCP or protocol == socket.IPPROTO_UDP:
+            return '{"timestamp": "%s", "event_type": "alert", ' \
+                '"src_ip": "%s", "src_port": %d, "dest_ip": "%s", ' \
+                '"dest_port": %d, "proto": %s, %s' % (
+                    timestamp, event["source-ip"], event["sport-itype"],
+                    event["destination-ip"], event["dport-icode"], proto,
+                    alert)
+        elif protocol == socket.IPPROTO_ICMP or \
+             protocol == socket.IPPROTO_ICMPV6:
+            return '{"timestamp": "%s", "event_type": "alert", ' \
+                '"src_ip": "%s", "dest_ip": "%s", "proto": %s, ' \
+                '"icmp_type": %d, "icmp_code": %d, %s' % (
+                    timestamp, event["source-ip"], event["destination-ip"],
+                    proto, event["sport-itype"], event["dport-icode"], alert)
+        return '{"timestamp": "%s", "event_type": "alert", ' \
+            '"src_ip": "%s", "dest_ip": "%s", "proto": %s, %s' % (
+                timestamp, event["source-ip"], event["destination-ip"],
+                proto, alert)
+
+    def render_alert(self, event):
+        return '"alert": {"action": "%s", "gid": %d, "signature_id": %d, ' \
+            '"rev": %d, "signature": %s, "category": %s, ' \
+            '"severity": %d}}' % (
+                "blocked" if event["blocked"] == 1 else "allowed",
+                event["generator-id"], event["signature-id"],
+                event["signature-revision"],
+                json.dumps(self.resolve_msg(event)),
+                json.dumps(self.resolve_classification(event)),
+                event["priority"])
+
     def resolve_classification(self, event, default=None):
         if self.classmap:
             classinfo = self.classmap.get(event["classification-id"])
@@ -186,11 +322,40 @@ class SuricataJsonFilter(object):
     def getprotobynumber(self, protocol):
         return proto_map.get(protocol, protocol)
 
+# Default output flush policy: the number of bytes to buffer, and the
+# number of seconds an event can wait in the buffer.
+FLUSH_BYTES = 64 * 1024
+FLUSH_INTERVAL = 0.5
+
 class OutputWrapper(object):
+    """Buffered line output to a file or stream.
 
-    def __init__(self, filename, fileobj=None):
+    Lines are buffered and written out when *flush_bytes* bytes or
+    *flush_events* lines are buffered, or the oldest line has been
+    buffered for *flush_interval* seconds.  :meth:`.write` returns
+    True when it flushed, so callers know which events are on disk.
+
+    If the output file is renamed or removed, such as by log rotation,
+    it is reopened on the next flush.  :meth:`.request_reopen` can be
+    called from a SIGHUP handler to force this.  The time taken by
+    each flush is recorded in :attr:`latency`.
+    """
+
+    def __init__(self, filename, fileobj=None, flush_bytes=FLUSH_BYTES,
+                 flush_events=None, flush_interval=FLUSH_INTERVAL):
         self.filename = filename
         self.fileobj = fileobj
+        self.flush_bytes = flush_bytes
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval
+        self.latency = unified2.LatencyStats()
+        self.events = 0
+
+        self.buf = []
+        self.buffered = 0
+        self.buffered_time = None
+        self.reopen_requested = False
+        self.inode = None
 
         if self.fileobj is None:
             self.reopen()
@@ -202,15 +367,315 @@ class OutputWrapper(object):
         if self.fileobj:
             self.fileobj.close()
         self.fileobj = open(self.filename, "ab")
+        st = os.fstat(self.fileobj.fileno())
+        self.inode = (st.st_dev, st.st_ino)
+        self.reopen_requested = False
+
+    def request_reopen(self, *args):
+        """Reopen the file on the next flush.  Safe to call from a
+        signal handler."""
+        self.reopen_requested = True
+
+    def rotated(self):
+        """Return True if the file has been removed or replaced since
+        it was opened."""
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return True
+        return (st.st_dev, st.st_ino) != self.inode
 
     def write(self, buf):
+        if not self.buf:
+            self.buffered_time = time.time()
+        self.buf.append(buf)
+        self.buffered += len(buf) + 1
+        if self.buffered >= self.flush_bytes or \
+           (self.flush_events and len(self.buf) >= self.flush_events) or \
+           time.time() - self.buffered_time >= self.flush_interval:
+            self.flush()
+            return True
+        return False
+
+    def send(self, lines):
+        """Write out lines."""
+        if self.isfile and (self.reopen_requested or self.rotated()):
+            self.reopen()
+        data = "\n".join(lines) + "\n"
         if self.isfile:
-            if not os.path.exists(self.filename):
-                self.reopen()
-        self.fileobj.write(buf)
-        self.fileobj.write("\n")
+            data = data.encode("utf-8")
+        self.fileobj.write(data)
         self.fileobj.flush()
 
+    def flush(self):
+        if not self.buf:
+            return
+        start = time.time()
+        self.send(self.buf)
+        self.events += len(self.buf)
+        self.buf = []
+        self.buffered = 0
+        self.latency.add(time.time() - start)
+
+    def close(self):
+        self.flush()
+        if self.isfile:
+            self.fileobj.close()
+
+# The range of the delay, in seconds, between attempts to send to a
+# socket that fail.  The delay doubles with each failure.
+RECONNECT_MIN = 0.1
+RECONNECT_MAX = 30.0
+
+# The maximum size of a datagram sent by SocketOutput.  Lines are
+# packed into datagrams of up to this size.
+MAX_DATAGRAM = 32 * 1024
+
+class SocketOutput(OutputWrapper):
+    """Buffered line output to a stream or datagram socket, such as a
+    local log shipper.
+
+    :param address: The address to connect to: a path for Unix
+      sockets, or a (host, port) tuple for TCP.
+    :param family: socket.AF_UNIX, or None for TCP to any address
+      family the host resolves to.
+    :param socktype: socket.SOCK_STREAM or socket.SOCK_DGRAM.
+
+    Other keyword arguments set the flush policy, see
+    :class:`OutputWrapper`.  The buffered lines are sent together,
+    packed into as few datagrams as possible on datagram sockets.
+
+    The connection is kept open between flushes.  If sending fails,
+    the connection is reopened and the lines sent again, waiting
+    between attempts with exponential backoff, so a flush blocks until
+    the lines are sent.  Reading, and the bookmark, wait for the sink
+    rather than events being dropped.  Lines may be sent twice to a
+    stream socket if the connection fails part way through a send.
+    """
+
+    def __init__(self, address, family=None, socktype=socket.SOCK_STREAM,
+                 **kwargs):
+        self.address = address
+        self.family = family
+        self.socktype = socktype
+        self.sock = None
+        self.reconnects = 0
+        self.dropped = 0
+        self.retry_min = RECONNECT_MIN
+        self.retry_max = RECONNECT_MAX
+        if isinstance(address, tuple):
+            name = "%s:%s" % address
+        else:
+            name = address
+        super(SocketOutput, self).__init__(name, **kwargs)
+
+    def reopen(self):
+        """Close the connection; it is opened again on the next
+        flush."""
+        self.disconnect()
+        self.reopen_requested = False
+
+    def rotated(self):
+        return False
+
+    def connect(self):
+        if self.family is None:
+            sock = socket.create_connection(self.address)
+        else:
+            sock = socket.socket(self.family, self.socktype)
+            try:
+                sock.connect(self.address)
+            except:
+                sock.close()
+                raise
+        self.sock = sock
+        LOG.info("Connected to %s.", self.filename)
+
+    def disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def connected(self):
+        """Return False if the peer of a stream socket has closed the
+        connection, so it can be reopened before sending rather than
+        losing what is sent."""
+        if self.socktype != socket.SOCK_STREAM:
+            return True
+        while select.select([self.sock], [], [], 0)[0]:
+            # Log shippers don't talk back, so anything readable is
+            # discarded, until the end of the connection.
+            if not self.sock.recv(4096):
+                return False
+        return True
+
+    def datagrams(self, lines):
+        datagram = []
+        size = 0
+        for line in lines:
+            line = line.encode("utf-8") + b"\n"
+            if datagram and size + len(line) > MAX_DATAGRAM:
+                yield b"".join(datagram)
+                datagram = []
+                size = 0
+            datagram.append(line)
+            size += len(line)
+        if datagram:
+            yield b"".join(datagram)
+
+    def send(self, lines):
+        if self.reopen_requested:
+            self.reopen()
+        if self.socktype == socket.SOCK_DGRAM:
+            for datagram in self.datagrams(lines):
+                self.send_data(datagram)
+        else:
+            self.send_data(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def send_data(self, data):
+        """Send data, reconnecting and retrying until it is sent."""
+        retry = self.retry_min
+        while True:
+            try:
+                if self.sock is not None and not self.connected():
+                    LOG.warning("Connection to %s closed.", self.filename)
+                    self.disconnect()
+                if self.sock is None:
+                    self.connect()
+                if self.socktype == socket.SOCK_DGRAM:
+                    self.sock.send(data)
+                else:
+                    self.sock.sendall(data)
+                return
+            except socket.error as err:
+                self.disconnect()
+                if err.errno == errno.EMSGSIZE:
+                    LOG.error("Dropping datagram of %d bytes, too large "
+                              "for %s.", len(data), self.filename)
+                    self.dropped += 1
+                    return
+                LOG.warning("Failed to send to %s, retrying in %.1fs: %s",
+                            self.filename, retry, err)
+            time.sleep(retry)
+            retry = min(retry * 2, self.retry_max)
+            self.reconnects += 1
+
+    def close(self):
+        self.flush()
+        self.disconnect()
+
+def open_output(spec, **kwargs):
+    """Return the output for an --output argument: unix:<path>,
+    unixgram:<path> or tcp:<host>:<port> for a socket, otherwise a
+    filename.  Keyword arguments set the flush policy."""
+    kind, _, address = spec.partition(":")
+    if kind == "unix":
+        return SocketOutput(address, socket.AF_UNIX, **kwargs)
+    elif kind == "unixgram":
+        return SocketOutput(
+            address, socket.AF_UNIX, socket.SOCK_DGRAM, **kwargs)
+    elif kind == "tcp":
+        host, _, port = address.rpartition(":")
+        return SocketOutput((host.strip("[]"), int(port)), **kwargs)
+    return OutputWrapper(spec, **kwargs)
+
+class Encoder(object):
+    """Encodes events with a :class:`SuricataJsonFilter` as they are
+    added.  :meth:`.results` returns the encoded events with their
+    marks, in the order they were added."""
+
+    def __init__(self, output_filter):
+        self.output_filter = output_filter
+        self.lines = []
+        self.marks = []
+
+    def add(self, event, mark):
+        self.lines.append(self.output_filter.encode(event))
+        self.marks.append(mark)
+
+    def results(self, block=False):
+        """Yield lists of encoded events and lists of their marks."""
+        if self.lines:
+            lines, marks = self.lines, self.marks
+            self.lines, self.marks = [], []
+            yield lines, marks
+
+    def close(self):
+        pass
+
+# The number of events sent to an encoder process at a time.
+ENCODE_BATCH = 256
+
+# The event fields SuricataJsonFilter.encode uses.  Only these are
+# sent to encoder processes, as a tuple, to keep pickling cheap.
+ENCODE_FIELDS = (
+    "event-second", "event-microsecond", "protocol", "source-ip",
+    "destination-ip", "sport-itype", "dport-icode", "generator-id",
+    "signature-id", "signature-revision", "classification-id", "priority",
+    "blocked",
+)
+
+# The SuricataJsonFilter of an encoder process.
+_worker_filter = None
+
+def _init_encoder_worker(msgmap, classmap, utc):
+    global _worker_filter
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_filter = SuricataJsonFilter(
+        msgmap, classmap, TimestampFormatter(utc=utc))
+
+def _encode_events(events):
+    return [_worker_filter.encode(dict(zip(ENCODE_FIELDS, values)))
+            for values in events]
+
+class EncoderPool(Encoder):
+    """Encodes events in a pool of processes, each with its own copy of
+    the maps.  Events are sent in batches of *batch_size*, and the
+    encoded batches are returned in order.  Once more than *depth*
+    batches are being encoded, :meth:`.results` waits for the oldest,
+    which bounds memory use when encoding falls behind."""
+
+    def __init__(self, workers, msgmap, classmap, utc=False,
+                 batch_size=ENCODE_BATCH, depth=None):
+        self.pool = multiprocessing.Pool(
+            workers, _init_encoder_worker, (msgmap, classmap, utc))
+        self.batch_size = batch_size
+        self.depth = depth or workers * 2
+        self.events = []
+        self.marks = []
+        self.batches = collections.deque()
+
+    def add(self, event, mark):
+        self.events.append(tuple([event[field] for field in ENCODE_FIELDS]))
+        self.marks.append(mark)
+        if len(self.events) >= self.batch_size:
+            self.submit()
+
+    def submit(self):
+        """Send the events added so far to be encoded."""
+        if self.events:
+            self.batches.append((self.pool.apply_async(
+                _encode_events, (self.events,)), self.marks))
+            self.events, self.marks = [], []
+
+    def results(self, block=False):
+        """Yield the batches that have been encoded, in order.  If
+        block is True, all events added so far are encoded and
+        returned."""
+        if block:
+            self.submit()
+        while self.batches:
+            result, marks = self.batches[0]
+            if not (block or result.ready() or
+                    len(self.batches) > self.depth):
+                break
+            self.batches.popleft()
+            yield result.get(), marks
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
 def load_from_snort_conf(snort_conf, classmap, msgmap):
     snort_etc = os.path.dirname(os.path.expanduser(snort_conf))
 
@@ -231,7 +696,18 @@ def load_from_snort_conf(snort_conf, classmap, msgmap):
 
 epilog = """If --directory and --prefix are provided files will be
 read from the specified 'spool' directory.  Otherwise files on the
-command line will be processed.
+command line will be processed.  If more than one --directory is
+given, the events of all the spools are merged by time.
+
+Output is buffered, and written whenever reading catches up or a
+--flush-* limit is reached.  Bookmarks only move past events once
+they have been written.  The output file is reopened if it is
+renamed or removed, or on SIGHUP.
+
+--output can also send to a log shipper over a Unix or TCP socket.
+Failed sends are retried, reconnecting with backoff, and reading
+waits for them, so events are not dropped when the sink is slow or
+down.
 """
 
 def main():
@@ -255,29 +731,67 @@ def main():
         help="attempt to load classifications and map files based on the "
         "location of the snort.conf")
     parser.add_argument(
-        "--directory", metavar="<spool directory>",
-        help="spool directory (eg: /var/log/snort)")
+        "--directory", metavar="<spool directory>", action="append",
+        help="spool directory (eg: /var/log/snort), may be given more "
+        "than once")
     parser.add_argument(
-        "--prefix", metavar="<spool file prefix>",
-        help="spool filename prefix (eg: unified2.log)")
+        "--prefix", metavar="<spool file prefix>", action="append",
+        help="spool filename prefix (eg: unified2.log), one for all "
+        "directories or one per directory")
     parser.add_argument(
         "--bookmark", action="store_true", default=False,
         help="enable bookmarking")
+    parser.add_argument(
+        "--bookmark-interval", metavar="<seconds>", type=float,
+        help="write the bookmark at most every this many seconds instead "
+        "of after every event")
     parser.add_argument(
         "--follow", action="store_true", default=False,
         help="follow files/continuous mode (spool mode only)")
     parser.add_argument(
         "--delete", action="store_true", default=False,
         help="delete spool files")
+    parser.add_argument(
+        "--archive", metavar="<directory>",
+        help="move spool files to this directory once read instead of "
+        "deleting them")
+    parser.add_argument(
+        "--compress", action="store_true", default=False,
+        help="gzip compress archived spool files")
+    parser.add_argument(
+        "--prefetch", metavar="<records>", type=int,
+        help="read up to this many records ahead on a background thread")
     parser.add_argument(
         "--output", metavar="<filename>",
-        help="output filename (eg: /var/log/snort/alerts.json")
+        help="output filename (eg: /var/log/snort/alerts.json), or "
+        "unix:<path>, unixgram:<path> or tcp:<host>:<port> to send to a "
+        "socket")
     parser.add_argument(
         "--stdout", action="store_true", default=False,
         help="also log to stdout if --output is a file")
+    parser.add_argument(
+        "--workers", metavar="<count>", type=int,
+        help="encode events in this many processes")
+    parser.add_argument(
+        "--utc", action="store_true", default=False,
+        help="render timestamps in UTC instead of local time")
+    parser.add_argument(
+        "--flush-bytes", metavar="<bytes>", type=int, default=FLUSH_BYTES,
+        help="write output once this many bytes are buffered (default: %d)"
+        % (FLUSH_BYTES))
+    parser.add_argument(
+        "--flush-events", metavar="<count>", type=int,
+        help="write output once this many events are buffered")
+    parser.add_argument(
+        "--flush-interval", metavar="<seconds>", type=float,
+        default=FLUSH_INTERVAL,
+        help="write output once an event has been buffered this long "
+        "(default: %s)" % (FLUSH_INTERVAL))
     parser.add_argument(
         "filenames", nargs="*")
     args = parser.parse_args()
+    if args.compress and not args.archive:
+        parser.error("--compress requires --archive")
 
     if args.snort_conf:
         load_from_snort_conf(args.snort_conf, classmap, msgmap)
@@ -300,30 +814,133 @@ def main():
     else:
         LOG.info("Loaded %s classifications.", classmap.size())
 
-    output_filter = SuricataJsonFilter(msgmap, classmap)
+    output_filter = SuricataJsonFilter(
+        msgmap, classmap, TimestampFormatter(utc=args.utc))
+
+    def create_encoder():
+        if args.workers:
+            return EncoderPool(args.workers, msgmap, classmap, utc=args.utc)
+        return Encoder(output_filter)
+    flush_policy = dict(
+        flush_bytes=args.flush_bytes, flush_events=args.flush_events,
+        flush_interval=args.flush_interval)
     if args.output:
-        output = OutputWrapper(args.output)
+        output = open_output(args.output, **flush_policy)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, output.request_reopen)
     else:
-        output = OutputWrapper("-", sys.stdout)
+        output = OutputWrapper("-", sys.stdout, **flush_policy)
 
     if args.directory and args.prefix:
-        reader = unified2.SpoolEventReader(
-            directory=args.directory,
-            prefix=args.prefix,
-            follow=args.follow,
-            delete=args.delete,
-            bookmark=args.bookmark)
-
-        for event in reader:
-            encoded = json.dumps(output_filter.filter(event))
-            output.write(encoded)
-            if output.isfile and args.stdout:
-                print(encoded)
+        if len(args.prefix) == 1:
+            prefixes = args.prefix * len(args.directory)
+        elif len(args.prefix) == len(args.directory):
+            prefixes = args.prefix
+        else:
+            print("error: give one --prefix, or one per --directory",
+                  file=sys.stderr)
+            return 1
+
+        # One worker archives the files of every spool, so names that
+        # clash between spools are given a suffix rather than lost.
+        delete = args.delete
+        if args.archive:
+            delete = unified2.RolloverWorker(
+                args.archive, compress=args.compress)
+
+        readers = []
+        for directory, prefix in zip(args.directory, prefixes):
+            bookmark = args.bookmark
+            if bookmark and args.bookmark_interval is not None:
+                bookmark = unified2.Unified2Bookmark(
+                    directory, prefix, commit_every=None,
+                    commit_interval=args.bookmark_interval)
+            readers.append(unified2.SpoolEventReader(
+                directory=directory,
+                prefix=prefix,
+                follow=args.follow,
+                delete=delete,
+                bookmark=bookmark,
+                types=unified2.EVENT_TYPES,
+                prefetch=args.prefetch))
+        if len(readers) == 1:
+            reader = readers[0]
+        else:
+            reader = unified2.MultiSpoolEventReader(
+                readers, follow=args.follow)
+
+        encoder = create_encoder()
+
+        # The mark of the last event written but not yet flushed, per
+        # spool.  Only these are acknowledged once flushed, so each
+        # bookmark is committed once per flush rather than per event.
+        pending = collections.OrderedDict()
+
+        def add_pending(mark):
+            if len(readers) == 1:
+                pending[None] = mark
+            elif mark is not None:
+                pending[mark[0]] = mark
+
+        def acknowledge():
+            for mark in pending.values():
+                reader.acknowledge(mark)
+            pending.clear()
+
+        def write(block=False):
+            for lines, marks in encoder.results(block):
+                for encoded, mark in zip(lines, marks):
+                    add_pending(mark)
+                    if output.write(encoded):
+                        acknowledge()
+                    if output.isfile and args.stdout:
+                        print(encoded)
+
+        try:
+            while True:
+                event, mark = reader.read()
+                if event:
+                    reader.latency.add(unified2.event_latency(event))
+                    encoder.add(event, mark)
+                    write()
+                    continue
+                write(block=True)
+                output.flush()
+                add_pending(mark)
+                acknowledge()
+                if not args.follow or reader.done:
+                    break
+                reader.wait()
+        finally:
+            encoder.close()
+            output.flush()
+            acknowledge()
+            reader.close()
+            LOG.info("Event latency: %s", reader.latency)
+            LOG.info("Output: %d events, write latency: %s",
+                     output.events, output.latency)
+            if args.prefetch:
+                for spool in readers:
+                    LOG.info("Prefetch %s: %s", spool.reader.directory,
+                             spool.reader.stats)
 
     elif args.filenames:
-        reader = unified2.FileEventReader(*args.filenames)
-        for event in reader:
-            print(json.dumps(output_filter.filter(event)))
+        reader = unified2.FileEventReader(
+            *args.filenames, types=unified2.EVENT_TYPES,
+            prefetch=args.prefetch)
+        encoder = create_encoder()
+        try:
+            for event in reader:
+                encoder.add(event, None)
+                for lines, _ in encoder.results():
+                    for encoded in lines:
+                        print(encoded)
+            for lines, _ in encoder.results(block=True):
+                for encoded in lines:
+                    print(encoded)
+        finally:
+            encoder.close()
+            reader.close()
 
     else:
         print("nothing to do.")
@@ -43,18 +43,42 @@ from __future__ import print_function
 import sys
 import os
 import os.path
+import errno
 import struct
 import collections
 import logging
 import fnmatch
 import time
 import socket
+import mmap
+import bisect
+import heapq
+import multiprocessing
+import threading
+import shutil
+import gzip
+try:
+    from collections import OrderedDict
+except ImportError as err:
+    from idstools.compat.ordereddict import OrderedDict
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from idstools import inotify
 
 LOG = logging.getLogger(__name__)
 
 # Record header length.
 HDR_LEN = 8
 
+# Record header: record type and record length.
+HDR_STRUCT = struct.Struct(">LL")
+
+# Suggested block size for buffered record reading.
+BUFFER_SIZE = 1024 * 1024
+
 # Length of an appid name.
 APPID_NAME_LEN = 16
 
@@ -69,6 +93,10 @@ EVENT_APPID     = 111
 EVENT_APPID_IP6 = 112
 APPSTAT         = 113
 
+# The event record types.
+EVENT_TYPES = frozenset([
+    EVENT, EVENT_IP6, EVENT_V2, EVENT_IP6_V2, EVENT_APPID, EVENT_APPID_IP6])
+
 class Field(object):
     """ A class to represent a field in a unified2 record. Used for
     building the decoders. """
@@ -230,6 +258,128 @@ class Event(dict):
 
         self.update(event)
 
+class LazyEvent(Event):
+    """LazyEvent is an :class:`.Event` that only unpacks the integer
+    fields at the start of the record, from the sensor-id to the
+    priority, when it is decoded.  The rest of the record, from the
+    addresses on, is kept as raw bytes and unpacked and converted the
+    first time any of those fields is accessed.
+
+    It behaves like an :class:`.Event`, but is cheaper when events
+    are filtered on fields like the signature-id before their
+    addresses are looked at.  Iterating over the event, or otherwise
+    looking at all of it, decodes all fields.  Decoding in two steps
+    costs more than decoding at once, so if most events have their
+    addresses looked at, use the default decoders.
+
+    LazyEvents are created by the decoders in :data:`.LAZY_DECODERS`.
+
+    """
+
+    # The raw bytes of the fields not decoded yet, or None.
+    _raw = None
+
+    def __missing__(self, key):
+        if self._raw is None or key not in self._decoder.lazy_keys:
+            raise KeyError(key)
+        self._decoder.decode_rest(self)
+        return dict.__getitem__(self, key)
+
+    def _decode_all(self):
+        if self._raw is not None:
+            self._decoder.decode_rest(self)
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        return self._raw is not None and key in self._decoder.lazy_keys
+
+    def __iter__(self):
+        self._decode_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._decode_all()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        self._decode_all()
+        if isinstance(other, LazyEvent):
+            other._decode_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._decode_all()
+        return dict.__repr__(self)
+
+    def __delitem__(self, key):
+        self._decode_all()
+        dict.__delitem__(self, key)
+
+    def __reduce__(self):
+        # Pickle as a plain Event.
+        return (Event, (dict(self.items()),))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        self._decode_all()
+        return dict.keys(self)
+
+    def values(self):
+        self._decode_all()
+        return dict.values(self)
+
+    def items(self):
+        self._decode_all()
+        return dict.items(self)
+
+    def copy(self):
+        return Event(self.items())
+
+    def pop(self, *args):
+        self._decode_all()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._decode_all()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self._decode_all()
+        return dict.setdefault(self, key, default)
+
+    if sys.version_info[0] < 3:
+
+        def has_key(self, key):
+            return key in self
+
+        def iterkeys(self):
+            self._decode_all()
+            return dict.iterkeys(self)
+
+        def itervalues(self):
+            self._decode_all()
+            return dict.itervalues(self)
+
+        def iteritems(self):
+            self._decode_all()
+            return dict.iteritems(self)
+
 class Packet(dict):
     """Packet represents a unified2 packet record with a dict-like interface.
 
@@ -274,6 +424,181 @@ class ExtraData(dict):
             self[field.name] = value
         self.update(kwargs)
 
+class CompactRecord(object):
+    """Base class for the compact record types.
+
+    Compact records hold their fields in slots rather than a dict, so
+    take a fraction of the memory of the dict based records.  Fields
+    are accessed as attributes, with the hyphens in field names
+    replaced by underscores (``event.signature_id``).  For
+    compatibility, fields can also be looked up by their usual name
+    (``event["signature-id"]``) and :meth:`.to_dict` converts the
+    record to the dict based record type.
+
+    Compact records are created by the decoders in
+    :data:`.COMPACT_DECODERS`.
+
+    """
+
+    __slots__ = ()
+
+    # The field names, and the dict based record class for to_dict.
+    _keys = ()
+    _dict_class = dict
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key.replace("-", "_"))
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def keys(self):
+        return list(self._keys)
+
+    def to_dict(self):
+        """Return the record as its dict based record type."""
+        record = self._dict_class.__new__(self._dict_class)
+        dict.__init__(record, [(key, self[key]) for key in self._keys])
+        return record
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s=%r" % (key.replace("-", "_"), self[key])
+            for key in self._keys))
+
+class CompactEvent(CompactRecord):
+    """A compact version of :class:`.Event`.
+
+    The *packets* and *extra_data* attributes are lists of the
+    :class:`.CompactPacket` and :class:`.CompactExtraData` records
+    associated with the event, or an empty tuple if there are none.
+
+    """
+
+    _keys = (
+        "sensor-id",
+        "event-id",
+        "event-second",
+        "event-microsecond",
+        "signature-id",
+        "generator-id",
+        "signature-revision",
+        "classification-id",
+        "priority",
+        "source-ip",
+        "destination-ip",
+        "sport-itype",
+        "dport-icode",
+        "protocol",
+        "impact-flag",
+        "impact",
+        "blocked",
+        "mpls-label",
+        "vlan-id",
+        "pad2",
+        "appid",
+        "packets",
+        "extra-data",
+    )
+    _dict_class = Event
+
+    __slots__ = tuple(key.replace("-", "_") for key in _keys)
+
+    def __init__(self, sensor_id, event_id, event_second, event_microsecond,
+                 signature_id, generator_id, signature_revision,
+                 classification_id, priority, source_ip, destination_ip,
+                 sport_itype, dport_icode, protocol, impact_flag, impact,
+                 blocked, mpls_label=None, vlan_id=None, pad2=None,
+                 appid=None):
+        self.sensor_id = sensor_id
+        self.event_id = event_id
+        self.event_second = event_second
+        self.event_microsecond = event_microsecond
+        self.signature_id = signature_id
+        self.generator_id = generator_id
+        self.signature_revision = signature_revision
+        self.classification_id = classification_id
+        self.priority = priority
+        self.source_ip = source_ip
+        self.destination_ip = destination_ip
+        self.sport_itype = sport_itype
+        self.dport_icode = dport_icode
+        self.protocol = protocol
+        self.impact_flag = impact_flag
+        self.impact = impact
+        self.blocked = blocked
+        self.mpls_label = mpls_label
+        self.vlan_id = vlan_id
+        self.pad2 = pad2
+        self.appid = appid
+        self.packets = ()
+        self.extra_data = ()
+
+    def to_dict(self):
+        """Return the event as an :class:`.Event`, including its
+        packets and extra data."""
+        event = super(CompactEvent, self).to_dict()
+        if self.pad2 is None:
+            # Only v2 events have padding.
+            del event["pad2"]
+        event["packets"] = [packet.to_dict() for packet in self.packets]
+        event["extra-data"] = [
+            extra_data.to_dict() for extra_data in self.extra_data]
+        return event
+
+class CompactPacket(CompactRecord):
+    """A compact version of :class:`.Packet`."""
+
+    _keys = tuple(field.name for field in PACKET_FIELDS)
+    _dict_class = Packet
+
+    __slots__ = tuple(key.replace("-", "_") for key in _keys)
+
+    def __init__(self, sensor_id, event_id, event_second, packet_second,
+                 packet_microsecond, linktype, length, data):
+        self.sensor_id = sensor_id
+        self.event_id = event_id
+        self.event_second = event_second
+        self.packet_second = packet_second
+        self.packet_microsecond = packet_microsecond
+        self.linktype = linktype
+        self.length = length
+        self.data = data
+
+class CompactExtraData(CompactRecord):
+    """A compact version of :class:`.ExtraData`."""
+
+    _keys = tuple(field.name for field in EXTRA_DATA_FIELDS)
+    _dict_class = ExtraData
+
+    __slots__ = tuple(key.replace("-", "_") for key in _keys)
+
+    def __init__(self, event_type, event_length, sensor_id, event_id,
+                 event_second, type, data_type, data_length, data):
+        self.event_type = event_type
+        self.event_length = event_length
+        self.sensor_id = sensor_id
+        self.event_id = event_id
+        self.event_second = event_second
+        self.type = type
+        self.data_type = data_type
+        self.data_length = data_length
+        self.data = data
+
+# Event and record classes, dict based and compact.
+EVENT_CLASSES = (Event, CompactEvent)
+PACKET_CLASSES = (Packet, CompactPacket)
+EXTRA_DATA_CLASSES = (ExtraData, CompactExtraData)
+
 class Unknown(object):
     """Class to represent an unknown record type.
 
@@ -305,42 +630,283 @@ class AbstractDecoder(object):
         self.format = ">" + "".join(
             [field.fmt for field in self.fields if field.fmt])
 
+        # Compile the format once, and precompute the names of the
+        # fields it unpacks so decoding doesn't have to rebuild them
+        # for every record.
+        self.struct = struct.Struct(self.format)
+        self.keys = tuple(field.name for field in self.fields if field.fmt)
+
+    def __reduce__(self):
+        # Compiled structs can't be pickled, so rebuild from the
+        # fields.  This lets decoder maps be passed to worker
+        # processes.
+        return (self.__class__, (self.fields,))
+
+    def decode_data(self, buf, zero_copy=False):
+        """Return the variable length portion of a record as bytes.
+
+        Buffered readers pass records in as memoryviews of their read
+        buffer, in which case the data is copied out so the record
+        does not keep the whole buffer alive, unless zero_copy is
+        True.
+        """
+        data = buf[self.fixed_len:]
+        if not zero_copy and isinstance(data, memoryview):
+            return data.tobytes()
+        return data
+
+# Default number of addresses remembered by an AddressCache.
+ADDRESS_CACHE_SIZE = 4096
+
+def _inet6_ntop(addr):
+    # Canonical IPv6 formatting (RFC 5952) for platforms without
+    # socket.inet_ntop.
+    parts = ["%x" % part for part in struct.unpack(">8H", addr)]
+    best_start, best_len = -1, 1
+    start = None
+    for i, part in enumerate(parts + ["end"]):
+        if part == "0":
+            if start is None:
+                start = i
+        elif start is not None:
+            if i - start > best_len:
+                best_start, best_len = start, i - start
+            start = None
+    if best_start < 0:
+        return ":".join(parts)
+    return "%s::%s" % (":".join(parts[:best_start]),
+                       ":".join(parts[best_start + best_len:]))
+
+def render_address(addr):
+    """Render a raw 4 byte IPv4 or 16 byte IPv6 address as a string
+    in canonical form."""
+    if len(addr) == 4:
+        return socket.inet_ntoa(addr)
+    if hasattr(socket, "inet_ntop"):
+        return socket.inet_ntop(socket.AF_INET6, addr)
+    return _inet6_ntop(addr)
+
+class AddressCache(object):
+    """A bounded least recently used cache of raw addresses rendered
+    to strings.  Events tend to involve the same few addresses over
+    and over, so most addresses are rendered with a dict lookup.
+
+    :param size: The maximum number of addresses to remember.
+
+    The number of cache hits and misses are counted in :attr:`hits`
+    and :attr:`misses` for tuning the size.
+
+    The decoders share :data:`.ADDRESS_CACHE` between threads, such as
+    those of a :class:`.PrefetchReader`, so the cache may be used
+    concurrently.  The counters are then approximate.
+    """
+
+    def __init__(self, size=ADDRESS_CACHE_SIZE):
+        self.size = size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if hasattr(self.cache, "move_to_end"):
+            self._touch = self.cache.move_to_end
+        else:
+            # This OrderedDict is written in Python, and a thread
+            # switch part way through an update could corrupt it.
+            self._touch = self._reinsert
+            self.render = self._locked_render
+
+    def _reinsert(self, addr):
+        self.cache[addr] = self.cache.pop(addr)
+
+    def render(self, addr):
+        """Return the rendered string for a raw address."""
+        try:
+            rendered = self.cache[addr]
+
+            # Raises KeyError if another thread has evicted the
+            # address since it was looked up, and it is added again.
+            self._touch(addr)
+        except KeyError:
+            self.misses += 1
+            rendered = self.cache[addr] = render_address(addr)
+            if len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+            return rendered
+        self.hits += 1
+        return rendered
+
+    def _locked_render(self, addr):
+        with self.lock:
+            return AddressCache.render(self, addr)
+
+    def hit_rate(self):
+        """Return the fraction of lookups that were cache hits."""
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+# The address cache shared by the default decoders.
+ADDRESS_CACHE = AddressCache()
+
 class EventDecoder(AbstractDecoder):
-    """ Decoder for event type records. """
-
-    def decode(self, buf):
-        """Decodes a buffer into an :class:`.Event` object."""
-        values = struct.unpack(self.format, buf)
-        keys = [field.name for field in self.fields]
-        event = dict(zip(keys, values))
-        event["source-ip"] = self.decode_ip(event["source-ip"])
-        event["destination-ip"] = self.decode_ip(event["destination-ip"])
-        if "appid" in event:
-            event["appid"] = str(event["appid"]).split("\x00")[0]
-        return Event(event)
+    """ Decoder for event type records.
+
+    :param fields: The field table for the event type.
+    :param address_cache: Optional :class:`.AddressCache` to render
+      addresses with, defaults to :data:`.ADDRESS_CACHE`.
+    """
+
+    def __init__(self, fields, address_cache=None):
+        super(EventDecoder, self).__init__(fields)
+        self.has_appid = "appid" in self.keys
+        self.address_cache = ADDRESS_CACHE if address_cache is None \
+            else address_cache
+
+        # Fields not present in this event type that Event provides
+        # defaults for.
+        self.defaults = tuple(
+            (key, None) for key in ("mpls-label", "vlan-id", "appid")
+            if key not in self.keys)
+
+    def decode(self, buf, zero_copy=False):
+        """Decodes a buffer into an :class:`.Event` object.
+
+        Events have no variable length data, so zero_copy has no
+        effect.
+        """
+        event = Event.__new__(Event)
+        dict.__init__(event, zip(self.keys, self.struct.unpack(buf)))
+        event["packets"] = []
+        event["extra-data"] = []
+        event.update(self.defaults)
+        render = self.address_cache.render
+        event["source-ip"] = render(event["source-ip"])
+        event["destination-ip"] = render(event["destination-ip"])
+        if self.has_appid:
+            event["appid"] = self.decode_appid(event["appid"])
+        return event
+
+    def decode_appid(self, appid):
+        appid = appid.split(b"\x00")[0]
+        if not isinstance(appid, str):
+            appid = appid.decode("ascii", "replace")
+        return appid
 
     def decode_ip(self, addr):
-        if len(addr) == 4:
-            return socket.inet_ntoa(addr)
-        else:
-            parts = struct.unpack("H" * (len(addr) / 2), addr)
-            return ":".join("%x" % p for p in parts)
+        return self.address_cache.render(addr)
+
+class LazyEventDecoder(EventDecoder):
+    """ Decoder for event type records that returns a
+    :class:`.LazyEvent`. """
+
+    def __init__(self, fields, address_cache=None):
+        super(LazyEventDecoder, self).__init__(fields, address_cache)
+
+        # Split the format at the source address into the fields
+        # unpacked up front and those unpacked on first access.
+        formats = [field.fmt for field in self.fields if field.fmt]
+        split = self.keys.index("source-ip")
+        self.eager_keys = self.keys[:split]
+        self.eager_struct = struct.Struct(">" + "".join(formats[:split]))
+        self.lazy_keys = frozenset(self.keys[split:])
+        self.lazy_struct = struct.Struct(">" + "".join(formats[split:]))
+        self.lazy_order = self.keys[split:]
+
+    def decode(self, buf, zero_copy=False):
+        """Decodes a buffer into a :class:`.LazyEvent` object."""
+        event = LazyEvent.__new__(LazyEvent)
+        dict.__init__(
+            event, zip(self.eager_keys, self.eager_struct.unpack_from(buf)))
+        event["packets"] = []
+        event["extra-data"] = []
+        event.update(self.defaults)
+        event._decoder = self
+        raw = buf[self.eager_struct.size:self.struct.size]
+        if isinstance(raw, memoryview):
+            raw = raw.tobytes()
+        event._raw = raw
+        return event
+
+    def decode_rest(self, event):
+        """Unpack and convert the fields of a :class:`.LazyEvent` that
+        were not decoded up front."""
+        raw, event._raw = event._raw, None
+        dict.update(event, zip(self.lazy_order, self.lazy_struct.unpack(raw)))
+        render = self.address_cache.render
+        event["source-ip"] = render(event["source-ip"])
+        event["destination-ip"] = render(event["destination-ip"])
+        if self.has_appid:
+            event["appid"] = self.decode_appid(event["appid"])
+
+class CompactEventDecoder(EventDecoder):
+    """ Decoder for event type records that returns a
+    :class:`.CompactEvent`. """
+
+    def __init__(self, fields, address_cache=None):
+        super(CompactEventDecoder, self).__init__(fields, address_cache)
+
+        # Whether the fields are in the order of the CompactEvent
+        # arguments.  The IPv6 appid event has no MPLS or VLAN fields.
+        self.positional = \
+            self.keys == CompactEvent._keys[0:len(self.keys)]
+
+    def decode(self, buf, zero_copy=False):
+        """Decodes a buffer into a :class:`.CompactEvent` object."""
+        values = list(self.struct.unpack(buf))
+        render = self.address_cache.render
+        values[9] = render(values[9])
+        values[10] = render(values[10])
+        if self.has_appid:
+            values[-1] = self.decode_appid(values[-1])
+        if self.positional:
+            return CompactEvent(*values)
+        return CompactEvent(*values[:-1], appid=values[-1])
 
 class PacketDecoder(AbstractDecoder):
     """ Decoder for packet type records. """
 
-    def decode(self, buf):
+    def decode(self, buf, zero_copy=False):
         """Decodes a buffer into a :class:`.Packet` object."""
-        parts = struct.unpack(self.format, buf[0:self.fixed_len])
-        return Packet(*parts, data=buf[self.fixed_len:])
+        packet = Packet.__new__(Packet)
+        dict.__init__(packet, zip(self.keys, self.struct.unpack_from(buf)))
+        packet["data"] = self.decode_data(buf, zero_copy)
+        return packet
 
 class ExtraDataDecoder(AbstractDecoder):
     """ Decoder for extra data type records. """
 
-    def decode(self, buf):
+    def decode(self, buf, zero_copy=False):
         """Decodes a buffer into an :class:`.ExtraData` object."""
-        parts = struct.unpack(self.format, buf[0:self.fixed_len])
-        return ExtraData(*parts, data=buf[self.fixed_len:])
+        extra_data = ExtraData.__new__(ExtraData)
+        dict.__init__(extra_data, zip(self.keys, self.struct.unpack_from(buf)))
+        extra_data["data"] = self.decode_data(buf, zero_copy)
+        return extra_data
+
+class CompactPacketDecoder(PacketDecoder):
+    """ Decoder for packet type records that returns a
+    :class:`.CompactPacket`. """
+
+    def decode(self, buf, zero_copy=False):
+        """Decodes a buffer into a :class:`.CompactPacket` object."""
+        return CompactPacket(
+            *self.struct.unpack_from(buf),
+            data=self.decode_data(buf, zero_copy))
+
+class CompactExtraDataDecoder(ExtraDataDecoder):
+    """ Decoder for extra data type records that returns a
+    :class:`.CompactExtraData`. """
+
+    def decode(self, buf, zero_copy=False):
+        """Decodes a buffer into a :class:`.CompactExtraData` object."""
+        return CompactExtraData(
+            *self.struct.unpack_from(buf),
+            data=self.decode_data(buf, zero_copy))
 
 # Map of decoders keyed by record type.
 DECODERS = {
@@ -354,19 +920,55 @@ DECODERS = {
     EXTRA_DATA:      ExtraDataDecoder(EXTRA_DATA_FIELDS),
 }
 
+# Map of decoders that decode event records into LazyEvents.
+LAZY_DECODERS = dict(DECODERS)
+LAZY_DECODERS.update({
+    EVENT:           LazyEventDecoder(EVENT_FIELDS),
+    EVENT_IP6:       LazyEventDecoder(EVENT_IP6_FIELDS),
+    EVENT_V2:        LazyEventDecoder(EVENT_V2_FIELDS),
+    EVENT_IP6_V2:    LazyEventDecoder(EVENT_IP6_V2_FIELDS),
+    EVENT_APPID:     LazyEventDecoder(EVENT_APPID_FIELDS),
+    EVENT_APPID_IP6: LazyEventDecoder(EVENT_APPID_IP6_FIELDS),
+})
+
+# Map of decoders that decode records into the compact record types.
+COMPACT_DECODERS = {
+    EVENT:           CompactEventDecoder(EVENT_FIELDS),
+    EVENT_IP6:       CompactEventDecoder(EVENT_IP6_FIELDS),
+    EVENT_V2:        CompactEventDecoder(EVENT_V2_FIELDS),
+    EVENT_IP6_V2:    CompactEventDecoder(EVENT_IP6_V2_FIELDS),
+    EVENT_APPID:     CompactEventDecoder(EVENT_APPID_FIELDS),
+    EVENT_APPID_IP6: CompactEventDecoder(EVENT_APPID_IP6_FIELDS),
+    PACKET:          CompactPacketDecoder(PACKET_FIELDS),
+    EXTRA_DATA:      CompactExtraDataDecoder(EXTRA_DATA_FIELDS),
+}
+
 class Aggregator(object):
     """A class implementing something like the aggregator pattern to
     aggregate records until an event can be built.
 
+    :param flush_deadline: Optional number of seconds after the last
+      record was added that the open event is considered complete,
+      see :meth:`.poll`.
+
     """
 
-    def __init__(self):
+    def __init__(self, flush_deadline=None):
         self.queue = collections.deque()
+        self.flush_deadline = flush_deadline
 
-    def add(self, record):
+        # When the last record was added, if using a deadline.
+        self.updated = None
+
+        # The position of the event record of the open event.
+        self.position = None
+
+    def add(self, record, position=None):
         """ Add a new record to aggregator.
 
         :param record: The decoded unified2 record to add.
+        :param position: Optional position of the record, returned by
+          :meth:`.tell` while its event is open.
 
         :return: If adding a new record allows an event to be
           completed, an :py:class:`.Event` will be returned.
@@ -374,16 +976,58 @@ class Aggregator(object):
 
         event = None
 
-        if isinstance(record, Event):
+        if isinstance(record, EVENT_CLASSES):
             if self.queue:
                 event = self.flush()
             self.queue.append(record)
+            self.position = position
         elif self.queue:
             self.queue.append(record)
         else:
             LOG.warn("Discarding non-event type while not in event context.")
+            return event
+        if self.flush_deadline is not None:
+            self.updated = time.time()
         return event
 
+    def time_left(self, now=None):
+        """Return the number of seconds until the deadline of the open
+        event, which may be negative if it has passed, or None if
+        there is no open event or no deadline."""
+        if self.flush_deadline is None or not self.queue:
+            return None
+        if now is None:
+            now = time.time()
+        return self.updated + self.flush_deadline - now
+
+    def poll(self, now=None):
+        """Flush the open event if its deadline has passed, that is if
+        no record has been added for flush_deadline seconds.
+
+        This allows an event to be completed by either the next event
+        or the deadline, rather than waiting for the next event when
+        records are being written slowly.
+
+        :returns: An :class:`.Event` or None.
+        """
+        time_left = self.time_left(now)
+        if time_left is not None and time_left <= 0:
+            return self.flush()
+        return None
+
+    def tell(self):
+        """Return the position passed to :meth:`.add` with the event
+        record of the open event, or None if there is no open event.
+        """
+        if not self.queue:
+            return None
+        return self.position
+
+    def clear(self):
+        """Discard the open event."""
+        self.queue.clear()
+        self.updated = None
+
     def flush(self):
         """Flush the queue.  This converts the records in the queue
         into an Event.
@@ -398,29 +1042,272 @@ class Aggregator(object):
             return None
 
         event = self.queue.popleft()
+        if isinstance(event, CompactEvent):
+            return self._flush_compact(event)
         assert(isinstance(event, Event))
         while self.queue:
             record = self.queue.popleft()
-            assert(not isinstance(record, Event))
-            if isinstance(record, Packet):
+            assert(not isinstance(record, EVENT_CLASSES))
+            if isinstance(record, PACKET_CLASSES):
                 event["packets"].append(record)
-            elif isinstance(record, ExtraData):
+            elif isinstance(record, EXTRA_DATA_CLASSES):
                 event["extra-data"].append(record)
         return event
 
+    def _flush_compact(self, event):
+        # Compact events only get lists if they have records to hold.
+        while self.queue:
+            record = self.queue.popleft()
+            assert(not isinstance(record, EVENT_CLASSES))
+            if isinstance(record, PACKET_CLASSES):
+                if not event.packets:
+                    event.packets = []
+                event.packets.append(record)
+            elif isinstance(record, EXTRA_DATA_CLASSES):
+                if not event.extra_data:
+                    event.extra_data = []
+                event.extra_data.append(record)
+        return event
+
+# Default number of open events held by a KeyedAggregator.
+MAX_OPEN_EVENTS = 1024
+
+class KeyedAggregator(object):
+    """An aggregator for spools where the records of several events
+    are interleaved, as happens when multiple threads write to one
+    spool.  Packet and extra-data records are added to the open event
+    with the same sensor-id and event-id, instead of to the last event
+    seen.
+
+    :param max_events: The maximum number of events held open.  When
+      exceeded, the oldest open event is completed.
+    :param flush_deadline: Optional number of seconds after its event
+      record was added that an open event is completed, see
+      :meth:`.poll`.
+
+    Events are returned in the order their event records arrived,
+    one at a time from :meth:`.add`, :meth:`.poll` and :meth:`.flush`.
+    When an event-id is reused, the old event is completed along with
+    any that arrived before it, and they are returned by the following
+    calls.
+    The number of events completed early because of *max_events* is
+    counted in :attr:`evicted`, the number completed by the deadline
+    in :attr:`expired`, and the number of records discarded because
+    their event was not open in :attr:`orphaned`.
+
+    Example::
+
+        reader = unified2.SpoolEventReader(
+            "/var/log/snort", "unified2.log",
+            aggregator=unified2.KeyedAggregator(flush_deadline=1))
+
+    """
+
+    def __init__(self, max_events=MAX_OPEN_EVENTS, flush_deadline=None):
+        self.max_events = max_events
+        self.flush_deadline = flush_deadline
+
+        # Open events with the time their event record was added and
+        # its position, keyed by (sensor-id, event-id) in order of
+        # arrival.
+        self.events = OrderedDict()
+
+        # Completed events and the positions of their event records,
+        # waiting to be returned.
+        self.completed = collections.deque()
+
+        self.evicted = 0
+        self.expired = 0
+        self.orphaned = 0
+
+    def add(self, record, position=None):
+        """Add a new record.
+
+        :param position: Optional position of the record, see
+          :meth:`.tell`.
+
+        :returns: An :class:`.Event` completed by adding the record,
+          or None.
+        """
+        if not isinstance(record, EVENT_CLASSES + PACKET_CLASSES +
+                          EXTRA_DATA_CLASSES):
+            return None
+        key = (record["sensor-id"], record["event-id"])
+        if isinstance(record, EVENT_CLASSES):
+            if key in self.events:
+                # The event-id has been reused, complete the old event.
+                self._complete(key)
+            self.events[key] = (record, time.time(), position)
+            if len(self.events) > self.max_events:
+                self.evicted += 1
+                self._complete(next(iter(self.events)))
+            return self.poll()
+        entry = self.events.get(key)
+        if entry is None:
+            self.orphaned += 1
+            LOG.debug("Discarding record for event %s, not open.", key)
+        else:
+            self._attach(entry[0], record)
+        return None
+
+    def _complete(self, key):
+        # Complete the open events up to and including key, keeping
+        # the order they arrived in.
+        while True:
+            oldest, entry = self.events.popitem(last=False)
+            self.completed.append((entry[0], entry[2]))
+            if oldest == key:
+                return
+
+    def _attach(self, event, record):
+        if isinstance(event, CompactEvent):
+            if isinstance(record, PACKET_CLASSES):
+                if not event.packets:
+                    event.packets = []
+                event.packets.append(record)
+            elif isinstance(record, EXTRA_DATA_CLASSES):
+                if not event.extra_data:
+                    event.extra_data = []
+                event.extra_data.append(record)
+        elif isinstance(record, PACKET_CLASSES):
+            event["packets"].append(record)
+        elif isinstance(record, EXTRA_DATA_CLASSES):
+            event["extra-data"].append(record)
+
+    def time_left(self, now=None):
+        """Return the number of seconds until the deadline of the
+        oldest open event, or None if there are no open events or no
+        deadline."""
+        if self.flush_deadline is None or not self.events:
+            return None
+        if now is None:
+            now = time.time()
+        added = next(iter(self.events.values()))[1]
+        return added + self.flush_deadline - now
+
+    def poll(self, now=None):
+        """Return the next completed event, or complete the oldest
+        open event if its deadline has passed.
+
+        :returns: An :class:`.Event` or None.
+        """
+        if self.completed:
+            return self.completed.popleft()[0]
+        time_left = self.time_left(now)
+        if time_left is not None and time_left <= 0:
+            self.expired += 1
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Return the next completed event, or complete the oldest
+        open event.  Call repeatedly to complete all open events.
+
+        :returns: An :class:`.Event` or None if there are no open
+          events.
+        """
+        if self.completed:
+            return self.completed.popleft()[0]
+        if not self.events:
+            return None
+        return self.events.popitem(last=False)[1][0]
+
+    def tell(self):
+        """Return the position passed to :meth:`.add` with the event
+        record of the oldest event not yet returned, or None if there
+        are none.  Reading from there again loses no events, as none
+        after it have been returned.
+        """
+        if self.completed:
+            return self.completed[0][1]
+        if self.events:
+            return next(iter(self.events.values()))[2]
+        return None
+
+    def clear(self):
+        """Discard all open and completed events."""
+        self.events.clear()
+        self.completed.clear()
+
+def event_latency(event):
+    """Return the number of seconds since the time of event."""
+    return time.time() - (
+        event["event-second"] + event["event-microsecond"] / 1e6)
+
+class LatencyStats(object):
+    """Running statistics of event latencies, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        if self.min is None or latency < self.min:
+            self.min = latency
+        if self.max is None or latency > self.max:
+            self.max = latency
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        if not self.count:
+            return "count=0"
+        return "count=%d min=%.3fms mean=%.3fms max=%.3fms" % (
+            self.count, self.min * 1000, self.mean() * 1000,
+            self.max * 1000)
+
 class Unified2Bookmark(object):
     """Class to represent a "bookmark" for unified2 spool
     directories.
 
+    :param directory: The spool directory.
+    :param prefix: The filename prefix of the spool files.
+    :param commit_every: Write the bookmark every this many updates.
+      Defaults to every update.
+    :param commit_interval: Write the bookmark when this many seconds
+      have passed since it was last written.
+    :param fsync: If True, sync the bookmark to disk when writing it,
+      so it survives a crash of the system, not just the process.
+
+    Updates are held in memory until the *commit_every* or
+    *commit_interval* policy says they should be written, or until
+    :meth:`.commit` is called.  If neither policy is set, the bookmark
+    is only written by :meth:`.commit`, which readers call on rollover,
+    when idle and on close.
+
+    With the default policy of writing every update without *fsync*,
+    the bookmark file is kept open and rewritten in place, as a rename
+    for every event would cost many times more.  Otherwise the
+    bookmark is written to a temporary file that is renamed over the
+    old one, so it is never seen half written.
+
     """
 
-    def __init__(self, directory, prefix):
+    def __init__(self, directory, prefix, commit_every=1,
+                 commit_interval=None, fsync=False):
         self.directory = directory
         self.prefix = prefix
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.fsync = fsync
 
         self.filename = os.path.join(
             os.path.abspath(self.directory), "_%s.bookmark" % (prefix))
 
+        # The latest update, the last written bookmark, the number of
+        # updates since then and when it was written.
+        self.pending = None
+        self.committed = None
+        self.updates = 0
+        self.commit_time = time.time()
+
+        # The open bookmark file when it is rewritten in place.
+        self.in_place = commit_every == 1 and not fsync
         self.fileobj = None
 
     def get(self):
@@ -436,37 +1323,433 @@ class Unified2Bookmark(object):
         return None, None
 
     def update(self, filename, offset):
-        """Update the bookmark with the given filename and offset."""
+        """Update the bookmark with the given filename and offset.
+        The bookmark is written if the commit policy says so."""
         if filename is None or offset is None:
             return
-        if not self.fileobj:
-            self.fileobj = open(self.filename, "wb")
-        self.fileobj.truncate(0)
-        self.fileobj.seek(0, 0)
-        self.fileobj.write(("%s\x00%d" % (
-            os.path.basename(filename), offset)).encode())
-        self.fileobj.flush()
-
-def decode_record(record_type, buf):
+        self.pending = (os.path.basename(filename), offset)
+        self.updates += 1
+        if self.commit_every and self.updates >= self.commit_every:
+            self.commit()
+        elif self.commit_interval is not None and \
+             time.time() - self.commit_time >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        """Write the latest update to the bookmark file, if it has
+        changed."""
+        self.updates = 0
+        self.commit_time = time.time()
+        if self.pending is None or self.pending == self.committed:
+            return
+        if self.in_place:
+            if not self.fileobj:
+                self.fileobj = open(self.filename, "wb")
+            self.fileobj.truncate(0)
+            self.fileobj.seek(0, 0)
+            self.fileobj.write(("%s\x00%d" % self.pending).encode())
+            self.fileobj.flush()
+            self.committed = self.pending
+            return
+        tmp_filename = "%s.tmp" % (self.filename)
+        with open(tmp_filename, "wb") as fileobj:
+            fileobj.write(("%s\x00%d" % self.pending).encode())
+            fileobj.flush()
+            if self.fsync:
+                os.fsync(fileobj.fileno())
+        if hasattr(os, "replace"):
+            os.replace(tmp_filename, self.filename)
+        else:
+            os.rename(tmp_filename, self.filename)
+        if self.fsync and hasattr(os, "O_DIRECTORY"):
+            # Sync the directory so the rename is durable too.
+            fd = os.open(os.path.dirname(self.filename), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.committed = self.pending
+
+# The default number of rolled over files that can be waiting for a
+# RolloverWorker before reading blocks.
+ROLLOVER_QUEUE_SIZE = 16
+
+# The gzip compression level for archived files.
+COMPRESS_LEVEL = 6
+
+class RolloverWorker(object):
+    """RolloverWorker deletes or archives spool files that have been
+    read, on a background thread, so that removing or compressing
+    large files does not hold up reading events.
+
+    :param archive_dir: Optional directory to move files into instead
+      of deleting them.
+    :param compress: If True, archived files are compressed with gzip,
+      adding a ``.gz`` suffix.
+    :param max_pending: The number of files that can be waiting to be
+      handled before :meth:`.submit` blocks.
+
+    A file's sidecar index, if :class:`.Unified2Index` wrote one, is
+    deleted with it, or moved with it when archived without
+    compression.
+
+    If a file of the same name is already in the archive directory, a
+    numeric suffix is added, so one worker can archive several spools
+    whose files share a prefix.  Errors are logged rather than raised,
+    with :attr:`failed` counting them.  :attr:`completed` counts the
+    files handled.
+
+    Example::
+
+        worker = unified2.RolloverWorker("/var/log/snort/archive",
+                                         compress=True)
+        reader = unified2.SpoolEventReader(
+            "/var/log/snort", "unified2.log", delete=worker)
+
+    """
+
+    def __init__(self, archive_dir=None, compress=False,
+                 max_pending=ROLLOVER_QUEUE_SIZE):
+        self.archive_dir = archive_dir
+        self.compress = compress
+        self.queue = queue.Queue(max_pending)
+        self.thread = None
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, filename):
+        """Queue filename to be deleted or archived."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+        self.queue.put(filename)
+
+    def _run(self):
+        while True:
+            filename = self.queue.get()
+            try:
+                if filename is None:
+                    return
+                self.handle(filename)
+            finally:
+                self.queue.task_done()
+
+    def handle(self, filename):
+        """Delete or archive filename now."""
+        try:
+            if self.archive_dir is None:
+                LOG.info("Deleting file %s.", filename)
+                os.unlink(filename)
+                self._remove_index(filename)
+            else:
+                self._archive(filename)
+            self.completed += 1
+        except (IOError, OSError) as err:
+            LOG.error("Failed to handle rolled over file %s: %s",
+                      filename, err)
+            self.failed += 1
+
+    def _remove_index(self, filename):
+        try:
+            os.unlink(filename + INDEX_SUFFIX)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+    def _destination(self, filename):
+        base = os.path.join(self.archive_dir, os.path.basename(filename))
+        suffix = ".gz" if self.compress else ""
+        dest = base + suffix
+        count = 0
+        while os.path.exists(dest):
+            count += 1
+            dest = "%s.%d%s" % (base, count, suffix)
+        return dest
+
+    def _archive(self, filename):
+        dest = self._destination(filename)
+        LOG.info("Archiving file %s to %s.", filename, dest)
+        if not self.compress:
+            shutil.move(filename, dest)
+            if os.path.exists(filename + INDEX_SUFFIX):
+                shutil.move(filename + INDEX_SUFFIX, dest + INDEX_SUFFIX)
+            return
+
+        # Compress to a temporary name so a partly written archive is
+        # never mistaken for a complete one.
+        tmp = "%s.tmp" % (dest)
+        try:
+            with open(filename, "rb") as fileobj:
+                out = gzip.open(tmp, "wb", COMPRESS_LEVEL)
+                try:
+                    shutil.copyfileobj(fileobj, out, BUFFER_SIZE)
+                finally:
+                    out.close()
+            os.rename(tmp, dest)
+        except:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        os.unlink(filename)
+
+        # The offsets in an index are of no use for the compressed
+        # file.
+        self._remove_index(filename)
+
+    def join(self):
+        """Wait for the files queued so far to be handled."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        """Handle the files queued so far, then stop the thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+# Sidecar index header: magic, version, reserved and the offset of the
+# first record not yet indexed.
+INDEX_HDR_STRUCT = struct.Struct(">4sHHQ")
+INDEX_MAGIC = b"U2IX"
+INDEX_VERSION = 1
+
+# The suffix added to the name of a unified2 file to name its sidecar
+# index.  Spool directory listings skip files with this suffix.
+INDEX_SUFFIX = ".idx"
+
+# Sidecar index entry: offset, record type, event-id, event-second and
+# sensor-id of an event record.
+INDEX_ENTRY_STRUCT = struct.Struct(">QLLLL")
+
+# The leading sensor-id, event-id and event-second fields common to
+# all event records.
+EVENT_ID_STRUCT = struct.Struct(">LLL")
+
+class Unified2Index(object):
+    """Class to represent a sidecar index of the event records in a
+    unified2 file, allowing events to be found by event-id or time
+    without decoding the records before them.
+
+    :param filename: The unified2 file to index.
+    :param index_filename: Optional filename of the index, defaults to
+      the unified2 filename with ``.idx`` appended.
+
+    The index is built by :meth:`.update`, which only scans the
+    records added since the last update, so it can be kept current
+    for a file that is still being written.
+
+    Each entry is a tuple of (offset, record type, event-id,
+    event-second, sensor-id).
+
+    Example::
+
+        index = unified2.Unified2Index("unified2.log.1382627941")
+        index.update()
+        offset = index.find_event(1234)
+
+    """
+
+    def __init__(self, filename, index_filename=None):
+        self.filename = filename
+        self.index_filename = index_filename or filename + INDEX_SUFFIX
+
+        self.entries = []
+        self.offset = 0
+        self.loaded = False
+
+        # Positions of entries by event-id, and whether event-seconds
+        # are in order so the index can be binary searched.
+        self.event_ids = {}
+        self.seconds = []
+        self.sorted = True
+
+    def _add(self, entry):
+        self.event_ids.setdefault(entry[2], []).append(len(self.entries))
+        if self.seconds and entry[3] < self.seconds[-1]:
+            self.sorted = False
+        self.seconds.append(entry[3])
+        self.entries.append(entry)
+
+    def _reset(self):
+        self.entries = []
+        self.offset = 0
+        self.event_ids = {}
+        self.seconds = []
+        self.sorted = True
+
+    def load(self):
+        """Load the index from its sidecar file, if one exists and
+        is valid for the unified2 file."""
+        self._reset()
+        self.loaded = True
+        try:
+            fileobj = open(self.index_filename, "rb")
+        except IOError:
+            return
+        with fileobj:
+            buf = fileobj.read()
+        if len(buf) < INDEX_HDR_STRUCT.size:
+            return
+        magic, version, _, offset = INDEX_HDR_STRUCT.unpack_from(buf, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            LOG.warning("Ignoring invalid index file %s." % (
+                self.index_filename))
+            return
+        if offset > os.path.getsize(self.filename):
+            # The unified2 file has been replaced.
+            return
+        count = (len(buf) - INDEX_HDR_STRUCT.size) // INDEX_ENTRY_STRUCT.size
+        for i in range(count):
+            entry = INDEX_ENTRY_STRUCT.unpack_from(
+                buf, INDEX_HDR_STRUCT.size + i * INDEX_ENTRY_STRUCT.size)
+            if entry[0] >= offset:
+                # Written after the header was last updated.
+                break
+            self._add(entry)
+        self.offset = offset
+
+    def scan(self):
+        """Scan the unified2 file for event records after the
+        indexed offset, stopping at EOF or at a partial record.
+
+        :returns: A list of the new entries.
+        """
+        entries = []
+        with open(self.filename, "rb") as fileobj:
+            fileobj.seek(self.offset)
+            offset = self.offset
+            while True:
+                buf = fileobj.read(HDR_LEN)
+                if len(buf) < HDR_LEN:
+                    break
+                rtype, rlen = HDR_STRUCT.unpack(buf)
+                if rtype in EVENT_TYPES and rlen >= EVENT_ID_STRUCT.size:
+                    buf = fileobj.read(EVENT_ID_STRUCT.size)
+                    if len(buf) < EVENT_ID_STRUCT.size or not skip_record(
+                            fileobj, rlen - EVENT_ID_STRUCT.size):
+                        break
+                    sensor_id, event_id, event_second = \
+                        EVENT_ID_STRUCT.unpack(buf)
+                    entries.append(
+                        (offset, rtype, event_id, event_second, sensor_id))
+                elif not skip_record(fileobj, rlen):
+                    break
+                offset += HDR_LEN + rlen
+        self.offset = offset
+        return entries
+
+    def update(self):
+        """Bring the index up to date with the unified2 file and
+        write any new entries to the sidecar file.
+
+        :returns: The number of new entries.
+        """
+        if not self.loaded:
+            self.load()
+        start = self.offset
+        entries = self.scan()
+        for entry in entries:
+            self._add(entry)
+        if self.offset == start and os.path.exists(self.index_filename):
+            return 0
+        mode = "r+b" if start and os.path.exists(self.index_filename) \
+            else "wb"
+        with open(self.index_filename, mode) as fileobj:
+            if mode == "wb":
+                fileobj.write(INDEX_HDR_STRUCT.pack(
+                    INDEX_MAGIC, INDEX_VERSION, 0, 0))
+            fileobj.seek(0, 2)
+            fileobj.write(b"".join(
+                INDEX_ENTRY_STRUCT.pack(*entry) for entry in entries))
+            # Entries past the offset in the header are ignored, so
+            # only update it once the entries have been written.
+            fileobj.flush()
+            fileobj.seek(0)
+            fileobj.write(INDEX_HDR_STRUCT.pack(
+                INDEX_MAGIC, INDEX_VERSION, 0, self.offset))
+        return len(entries)
+
+    def find_event(self, event_id, sensor_id=None):
+        """Find the offset of an event record by event-id, and
+        optionally sensor-id.
+
+        :returns: The offset of the event record or None if not found.
+        """
+        for i in self.event_ids.get(event_id, ()):
+            entry = self.entries[i]
+            if sensor_id is None or entry[4] == sensor_id:
+                return entry[0]
+        return None
+
+    def find_time(self, seconds):
+        """Find the offset of the first event record with an
+        event-second at or after seconds.
+
+        :returns: The offset of the event record or None if there is
+          no such event.
+        """
+        if self.sorted:
+            i = bisect.bisect_left(self.seconds, seconds)
+            if i < len(self.entries):
+                return self.entries[i][0]
+            return None
+        for entry in self.entries:
+            if entry[3] >= seconds:
+                return entry[0]
+        return None
+
+def decode_record(record_type, buf, zero_copy=False, decoders=None):
     """Decodes a raw record into an object representing the record.
 
     :param record_type: The type of record.
     :param buf: Buffer containing the raw record.
+    :param zero_copy: If buf is a memoryview, return the data of
+      packet and extra-data records as a memoryview into buf instead
+      of copying it.
+    :param decoders: Optional map of decoders keyed by record type to
+      use instead of :data:`.DECODERS`, such as
+      :data:`.LAZY_DECODERS`.
 
     :returns: The decoded record as a :class:`.Event`,
       :class:`.Packet`, :class:`.ExtraData` or :class:`.Unknown` if the
       record is of an unknown type.
     """
-    if record_type in DECODERS:
-        return DECODERS[record_type].decode(buf)
+    if decoders is None:
+        decoders = DECODERS
+    if record_type in decoders:
+        return decoders[record_type].decode(buf, zero_copy)
     else:
+        if not zero_copy and isinstance(buf, memoryview):
+            buf = buf.tobytes()
         return Unknown(record_type, buf)
 
-def read_record(fileobj):
+def skip_record(fileobj, rlen):
+    """Skip over the body of a record by seeking past it rather than
+    reading it.  The file object must be positioned just after the
+    record header.
+
+    :returns: True if the record was skipped, or False if the file
+      does not contain the whole record yet.  If False, the position
+      of the file object is undefined.
+    """
+    if rlen == 0:
+        return True
+    # Seeking past the end of a file succeeds, so check that the last
+    # byte of the record is actually there.
+    fileobj.seek(rlen - 1, 1)
+    return len(fileobj.read(1)) == 1
+
+def read_record(fileobj, decoders=None, types=None):
     """Reads a unified2 record from the provided file object.
 
     :param fileobj: The file like object to read from.  Currently this
       object needs to support read, seek and tell.
+    :param decoders: Optional map of decoders, see
+      :func:`.decode_record`.
+    :param types: Optional set of record types to return.  Records of
+      other types are skipped over without being read or decoded.
 
     :returns: If a complete record is read a :py:class:`.Record` will
       be returned, otherwise None will be returned.
@@ -477,28 +1760,328 @@ def read_record(fileobj):
 
     """
 
-    offset = fileobj.tell()
-    try:
+    while True:
+        offset = fileobj.tell()
+        try:
+            buf = fileobj.read(HDR_LEN)
+            if not buf:
+                # EOF.
+                return None
+            elif len(buf) < HDR_LEN:
+                raise EOFError()
+            rtype, rlen = HDR_STRUCT.unpack(buf)
+            if types is not None and rtype not in types:
+                if not skip_record(fileobj, rlen):
+                    raise EOFError()
+                continue
+            buf = fileobj.read(rlen)
+            if len(buf) < rlen:
+                raise EOFError()
+            return decode_record(rtype, buf, decoders=decoders)
+        except EOFError as err:
+            fileobj.seek(offset)
+            raise err
+
+# Largest record length considered plausible when resynchronising on
+# record headers.
+MAX_RECORD_LEN = 1024 * 1024
+
+# Number of record headers that must follow a candidate header for it
+# to be accepted when resynchronising.
+RESYNC_RECORDS = 3
+
+# Once a time search has narrowed the range to this many bytes, the
+# rest is scanned record by record.
+SEEK_SCAN_LEN = 64 * 1024
+
+def _valid_header(rtype, rlen):
+    if rtype in EVENT_TYPES:
+        return rlen == DECODERS[rtype].struct.size
+    return rtype in (PACKET, EXTRA_DATA, APPSTAT) and \
+        0 < rlen <= MAX_RECORD_LEN
+
+def find_record_header(fileobj, offset, end=None):
+    """Find the first record header at or after offset in a file,
+    for resynchronising on record boundaries after seeking to an
+    arbitrary offset.
+
+    A header is accepted if its type and length are plausible and it
+    is followed by :data:`.RESYNC_RECORDS` more plausible headers, or
+    by the end of the file.
+
+    :param fileobj: The file object to search.
+    :param offset: The offset to start searching at.
+    :param end: Optional offset to stop searching at.
+
+    :returns: The offset of the record header or None if none is
+      found.
+    """
+    size = os.fstat(fileobj.fileno()).st_size
+    if end is None or end > size:
+        end = size
+    while offset + HDR_LEN <= end:
+        fileobj.seek(offset)
+        buf = fileobj.read(SEEK_SCAN_LEN + HDR_LEN)
+        for pos in range(max(len(buf) - HDR_LEN + 1, 0)):
+            if offset + pos >= end:
+                return None
+            rtype, rlen = HDR_STRUCT.unpack_from(buf, pos)
+            if not _valid_header(rtype, rlen):
+                continue
+            candidate = offset + pos
+            if _check_record_chain(fileobj, candidate, size):
+                return candidate
+        offset += SEEK_SCAN_LEN
+    return None
+
+def _check_record_chain(fileobj, offset, size):
+    for _ in range(RESYNC_RECORDS + 1):
+        if offset == size:
+            return True
+        fileobj.seek(offset)
         buf = fileobj.read(HDR_LEN)
-        if not buf:
-            # EOF.
+        if len(buf) < HDR_LEN:
+            return False
+        rtype, rlen = HDR_STRUCT.unpack(buf)
+        if not _valid_header(rtype, rlen):
+            return False
+        offset += HDR_LEN + rlen
+    return True
+
+def _next_event_time(fileobj, offset, end=None):
+    """Walk the record headers from offset to the next event record.
+
+    Returns a tuple of the event record offset, its event-second and
+    the offset of the record after it.  If no complete event record
+    starts before end, the event offset and second are None and the
+    last offset is where the walk stopped.
+    """
+    fileobj.seek(offset)
+    while end is None or offset < end:
+        buf = fileobj.read(HDR_LEN)
+        if len(buf) < HDR_LEN:
+            break
+        rtype, rlen = HDR_STRUCT.unpack(buf)
+        if rtype in EVENT_TYPES and rlen >= EVENT_ID_STRUCT.size:
+            buf = fileobj.read(EVENT_ID_STRUCT.size)
+            if len(buf) < EVENT_ID_STRUCT.size or not skip_record(
+                    fileobj, rlen - EVENT_ID_STRUCT.size):
+                break
+            return offset, EVENT_ID_STRUCT.unpack(buf)[2], \
+                offset + HDR_LEN + rlen
+        if not skip_record(fileobj, rlen):
+            break
+        offset += HDR_LEN + rlen
+    return None, None, offset
+
+def seek_time(fileobj, seconds):
+    """Seek a unified2 file to the first event record with an
+    event-second at or after seconds, without reading the whole file.
+
+    If a sidecar index written by :class:`.Unified2Index` exists for
+    the file it is used, otherwise the file is binary searched by
+    probing at offsets, resynchronising on the record headers with
+    :func:`.find_record_header`.  This assumes events were written in
+    time order, as they are by Snort and Suricata, give or take the
+    small differences between events being processed in parallel.
+
+    :param fileobj: The file object to seek, which must be a real
+      file.
+    :param seconds: The time to seek to, in seconds since the epoch.
+
+    :returns: The offset of the event record or None if there is no
+      such event, in which case the file is positioned after the last
+      complete record.
+    """
+    lo = 0
+    hi = os.fstat(fileobj.fileno()).st_size
+
+    index_filename = getattr(fileobj, "name", "") + INDEX_SUFFIX
+    if os.path.exists(index_filename):
+        index = Unified2Index(fileobj.name, index_filename)
+        index.load()
+        offset = index.find_time(seconds)
+        if offset is not None:
+            fileobj.seek(offset)
+            return offset
+        # Events before the indexed offset are all too early.
+        lo = index.offset
+
+    while hi - lo > SEEK_SCAN_LEN:
+        mid = (lo + hi) // 2
+        offset = find_record_header(fileobj, mid, hi)
+        if offset is None:
+            hi = mid
+            continue
+        event_offset, second, next_offset = _next_event_time(
+            fileobj, offset, hi)
+        if event_offset is None or second >= seconds:
+            hi = mid
+        else:
+            lo = next_offset
+
+    offset = lo
+    while True:
+        event_offset, second, offset = _next_event_time(fileobj, offset)
+        if event_offset is None:
+            fileobj.seek(offset)
             return None
-        elif len(buf) < HDR_LEN:
-            raise EOFError()
-        rtype, rlen = struct.unpack(">LL", buf)
-        buf = fileobj.read(rlen)
-        if len(buf) < rlen:
-            raise EOFError()
-        return decode_record(rtype, buf)
-    except EOFError as err:
-        fileobj.seek(offset)
-        raise err
+        if second >= seconds:
+            fileobj.seek(event_offset)
+            return event_offset
+
+def filename_timestamp(filename):
+    """Get the timestamp from the suffix of a spool filename, like
+    ``unified2.log.1382627941``, or None if it doesn't have one."""
+    suffix = filename.rsplit(".", 1)[-1]
+    if suffix.isdigit():
+        return int(suffix)
+    return None
+
+def filename_sort_key(filename):
+    """Sort key for spool filenames, ordering them by the timestamp
+    in their suffix, with filenames without one first."""
+    timestamp = filename_timestamp(filename)
+    if timestamp is None:
+        return (0, 0, filename)
+    return (1, timestamp, filename)
+
+# Field table for each event record type.
+EVENT_FIELDS_BY_TYPE = {
+    EVENT:           EVENT_FIELDS,
+    EVENT_IP6:       EVENT_IP6_FIELDS,
+    EVENT_V2:        EVENT_V2_FIELDS,
+    EVENT_IP6_V2:    EVENT_IP6_V2_FIELDS,
+    EVENT_APPID:     EVENT_APPID_FIELDS,
+    EVENT_APPID_IP6: EVENT_APPID_IP6_FIELDS,
+}
+
+# NumPy equivalents of the struct formats used by fields.
+NUMPY_FORMATS = {
+    "L": ">u4",
+    "H": ">u2",
+    "B": "u1",
+}
+
+def numpy_dtype(fields):
+    """Build a NumPy structured dtype for a record from its field
+    table, such as :data:`.EVENT_FIELDS`.  Fixed length byte fields,
+    like addresses, become raw bytes columns.
+
+    Requires NumPy.
+    """
+    import numpy
+    names = []
+    formats = []
+    for field in fields:
+        if not field.fmt:
+            continue
+        names.append(field.name)
+        if field.fmt in NUMPY_FORMATS:
+            formats.append(NUMPY_FORMATS[field.fmt])
+        else:
+            formats.append("S%d" % struct.calcsize(field.fmt))
+    return numpy.dtype({"names": names, "formats": formats})
+
+def scan_record_offsets(buf, types=None):
+    """Scan the record headers in a buffer holding a unified2 file.
+
+    :param buf: A buffer, such as bytes or an mmap, holding the file.
+    :param types: Optional set of record types to return offsets for.
+
+    :returns: A dict of lists of the offsets of the record bodies,
+      keyed by record type.  A partial record at the end of the buffer
+      is ignored.
+
+    Each header gives the length of its record, and so the offset of
+    the next header, so this is a plain Python loop over every record
+    in the buffer, packets included.
+    """
+    offsets = collections.defaultdict(list)
+    offset = 0
+    end = len(buf)
+    while offset + HDR_LEN <= end:
+        rtype, rlen = HDR_STRUCT.unpack_from(buf, offset)
+        if offset + HDR_LEN + rlen > end:
+            break
+        if types is None or rtype in types:
+            offsets[rtype].append(offset + HDR_LEN)
+        offset += HDR_LEN + rlen
+    return offsets
+
+def read_event_arrays(filenames):
+    """Bulk decode the event records of one or more unified2 files
+    into NumPy structured arrays, for vectorized analysis of large
+    numbers of events.  Packet and extra-data records are skipped.
+
+    The headers of each file are scanned to find the event records
+    with :func:`.scan_record_offsets`, one record at a time, then the
+    event records of a type are copied out together and their fields
+    decoded in one step.  Only the decoding is vectorized; the scan is
+    still a Python loop over every record header.  The dtypes are
+    built by :func:`.numpy_dtype` from the field tables, and the
+    source and destination addresses are kept as raw bytes.
+
+    Requires NumPy.
+
+    :param filenames: A list of filenames to read.
+
+    :returns: A dict of structured arrays keyed by event record type,
+      for example :data:`.EVENT_V2`, holding the events of that type
+      from all files in order.
+
+    Example::
+
+        arrays = unified2.read_event_arrays(filenames)
+        events = arrays[unified2.EVENT_V2]
+        sids, counts = numpy.unique(
+            events["signature-id"], return_counts=True)
+
+    """
+    import numpy
+
+    arrays = collections.defaultdict(list)
+    for filename in filenames:
+        with open(filename, "rb") as fileobj:
+            if os.fstat(fileobj.fileno()).st_size == 0:
+                continue
+            buf = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offsets = scan_record_offsets(buf, EVENT_TYPES)
+            for rtype, starts in offsets.items():
+                dtype = numpy_dtype(EVENT_FIELDS_BY_TYPE[rtype])
+                size = dtype.itemsize
+                arrays[rtype].append(numpy.frombuffer(
+                    b"".join(buf[start:start + size] for start in starts),
+                    dtype=dtype))
+        finally:
+            buf.close()
+
+    return dict((rtype, numpy.concatenate(parts))
+                for rtype, parts in arrays.items())
 
 class RecordReader(object):
     """RecordReader reads and decodes unified2 records from a
     file-like object.
 
     :param fileobj: The file-like object to read from.
+    :param buffer_size: Optional block size.  If set, the file is
+      read in blocks of this many bytes (for example
+      :data:`.BUFFER_SIZE`) and records are decoded out of the
+      buffer, instead of reading each record with its own reads.
+    :param decoders: Optional map of decoders keyed by record type,
+      for example :data:`.LAZY_DECODERS`.  Defaults to
+      :data:`.DECODERS`.
+    :param types: Optional set of record types to return, for example
+      :data:`.EVENT_TYPES`.  The bodies of other records are seeked
+      over without being read or decoded.
+
+    In buffered mode the offset of the underlying file object will be
+    ahead of the last record returned, use :meth:`.tell` to get the
+    offset of the next record.  On a partial record at the end of the
+    file, the file object is positioned at the start of the partial
+    record and :exc:`.EOFError` raised, just like
+    :func:`.read_record`.
 
     Example::
 
@@ -509,10 +2092,24 @@ class RecordReader(object):
 
     """
 
-    def __init__(self, fileobj):
-        self.fileobj = fileobj
+    # Buffered readers that hand out views into their buffer set this.
+    zero_copy = False
 
-        if sys.platform == "darwin" and sys.version_info[0] < 3:
+    def __init__(self, fileobj, buffer_size=None, decoders=None,
+                 types=None):
+        self.fileobj = fileobj
+        self.buffer_size = buffer_size
+        self.decoders = DECODERS if decoders is None else decoders
+        self.types = None if types is None else frozenset(types)
+
+        # The read buffer and the offset of the next record in it.
+        self._buf = b""
+        self._view = memoryview(self._buf)
+        self._pos = 0
+
+        if self.buffer_size:
+            self.next = self._buffered_next
+        elif sys.platform == "darwin" and sys.version_info[0] < 3:
             self.next = self._darwin_next
         else:
             self.next = self._default_next
@@ -527,7 +2124,7 @@ class RecordReader(object):
         return self.default_next()
 
     def _default_next(self):
-        return read_record(self.fileobj)
+        return read_record(self.fileobj, self.decoders, self.types)
 
     def _darwin_next(self):
         record = self._default_next()
@@ -535,18 +2132,232 @@ class RecordReader(object):
             self.fileobj.seek(self.fileobj.tell())
         return record
 
+    def _buffered_next(self):
+        types = self.types
+        while True:
+            buf, pos = self._buf, self._pos
+            avail = len(buf) - pos
+            need = HDR_LEN
+            if avail >= HDR_LEN:
+                rtype, rlen = HDR_STRUCT.unpack_from(buf, pos)
+                need += rlen
+                if types is not None and rtype not in types:
+                    if avail >= need:
+                        self._pos = pos + need
+                        continue
+                    elif self._skip(need - avail):
+                        continue
+                    break
+                if avail >= need:
+                    start = pos + HDR_LEN
+                    self._pos = start + rlen
+                    decoder = self.decoders.get(rtype)
+                    if decoder is not None:
+                        return decoder.decode(
+                            self._view[start:self._pos], self.zero_copy)
+                    return decode_record(
+                        rtype, self._view[start:self._pos], self.zero_copy)
+            if not self._fill(need):
+                break
+
+        if avail == 0:
+            # EOF.
+            return None
+
+        # A partial record.
+        self._rewind()
+        raise EOFError()
+
+    def _fill(self, need):
+        """Read another block onto the unconsumed tail of the buffer,
+        reading at least enough for a record of need bytes.
+
+        Returns False if no data could be read.
+        """
+        tail = self._buf[self._pos:]
+        data = self.fileobj.read(max(self.buffer_size, need - len(tail)))
+        if not data:
+            return False
+        self._buf = tail + data
+        self._view = memoryview(self._buf)
+        self._pos = 0
+        return True
+
+    def _skip(self, count):
+        """Skip the rest of a record that extends count bytes past the
+        end of the buffer, by seeking the file object past it.
+
+        Returns False, leaving the buffer as it was, if the file does
+        not contain the whole record yet.
+        """
+        offset = self.fileobj.tell()
+        if not skip_record(self.fileobj, count):
+            self.fileobj.seek(offset)
+            return False
+        self._buf = b""
+        self._view = memoryview(self._buf)
+        self._pos = 0
+        return True
+
+    def _rewind(self):
+        """Put the file object back at the start of the next record,
+        dropping the buffer, so the next read picks the record up in
+        full."""
+        self.fileobj.seek(self.tell())
+        self._buf = b""
+        self._view = memoryview(self._buf)
+        self._pos = 0
+
     def tell(self):
-        """Get the current offset in the underlying file object."""
-        return self.fileobj.tell()
+        """Get the offset of the next record in the underlying file
+        object."""
+        return self.fileobj.tell() - (len(self._buf) - self._pos)
+
+    def seek(self, offset):
+        """Position the reader at offset, which must be the start of a
+        record, for example an offset from :class:`.Unified2Index`."""
+        self.fileobj.seek(offset)
+        self._buf = b""
+        self._view = memoryview(self._buf)
+        self._pos = 0
+
+    def close(self):
+        """Release the read buffer.  The file object is not closed."""
+        self._buf = b""
+        self._view = memoryview(self._buf)
+        self._pos = 0
 
     def __iter__(self):
         return iter(self.next, None)
 
+def _can_view_mmap():
+    # Python 2 memory maps do not support the buffer protocol needed
+    # to make a memoryview of them.
+    mapping = mmap.mmap(-1, 1)
+    try:
+        memoryview(mapping).release()
+    except TypeError:
+        return False
+    finally:
+        mapping.close()
+    return True
+
+# True if memory maps can be read with a MmapRecordReader.
+MMAP_AVAILABLE = _can_view_mmap()
+
+class MmapRecordReader(RecordReader):
+    """MmapRecordReader reads and decodes unified2 records from a
+    file by memory mapping it, rather than reading it into buffers.
+    It is intended for files that are no longer being written, such
+    as rolled over spool files.
+
+    :param fileobj: The file object to read from.  It must be a real
+      file.  Reading starts at its current offset.
+    :param zero_copy: If True, the data of :class:`.Packet` and
+      :class:`.ExtraData` records is returned as a memoryview into
+      the mapped file instead of bytes.  The mapping stays valid for
+      as long as any such view is referenced.
+    :param decoders: Optional map of decoders, see
+      :class:`.RecordReader`.
+    :param types: Optional set of record types to return, see
+      :class:`.RecordReader`.
+
+    If the end of the mapping is reached and the file has grown since
+    it was mapped, the file is mapped again, so reading a file that
+    is still growing works, though less efficiently than with
+    :class:`.RecordReader`.
+
+    A memoryview can not be made of a memory map on Python 2, so
+    NotImplementedError is raised there; see :data:`MMAP_AVAILABLE`.
+
+    Example::
+
+        fileobj = open("/var/log/snort/merged.log.1382627987", "rb")
+        reader = MmapRecordReader(fileobj):
+        for record in reader:
+            print(record)
+
+    """
+
+    def __init__(self, fileobj, zero_copy=False, decoders=None, types=None):
+        if not MMAP_AVAILABLE:
+            raise NotImplementedError(
+                "MmapRecordReader requires a memoryview of a memory map, "
+                "which this version of Python does not support")
+        super(MmapRecordReader, self).__init__(
+            fileobj, decoders=decoders, types=types)
+        self.zero_copy = zero_copy
+        self._map = None
+        self._map_file()
+        self._pos = fileobj.tell()
+        self.next = self._buffered_next
+
+    def _map_file(self):
+        size = os.fstat(self.fileobj.fileno()).st_size
+        if size <= len(self._buf):
+            return False
+        self.close()
+        self._map = mmap.mmap(
+            self.fileobj.fileno(), size, access=mmap.ACCESS_READ)
+        self._buf = self._map
+        self._view = memoryview(self._map)
+        return True
+
+    def _fill(self, need):
+        return self._map_file()
+
+    def _skip(self, count):
+        return self._map_file()
+
+    def _rewind(self):
+        self.fileobj.seek(self._pos)
+
+    def tell(self):
+        """Get the offset of the next record in the file."""
+        return self._pos
+
+    def seek(self, offset):
+        """Position the reader at offset, which must be the start of a
+        record."""
+        self.fileobj.seek(offset)
+        self._pos = offset
+
+    def close(self):
+        """Unmap the file.  The file object is not closed.
+
+        If zero copy views into the mapping are still referenced, the
+        mapping is released when the last of them is.
+        """
+        if self._map is not None:
+            try:
+                self._view.release()
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+        self._buf = b""
+        self._view = memoryview(self._buf)
+
 class FileRecordReader(object):
     """FileRecordReader reads and decodes unified2 records from one or
     more files supplied by filename.
 
     :param files...: One or more filenames to read records from.
+    :param buffer_size: Optional block size for buffered reading, see
+      :class:`.RecordReader`.
+    :param use_mmap: If True, read the files with a
+      :class:`.MmapRecordReader`.  Ignored if :data:`MMAP_AVAILABLE`
+      is False.
+    :param zero_copy: See :class:`.MmapRecordReader`.
+    :param decoders: Optional map of decoders, see
+      :class:`.RecordReader`.
+    :param types: Optional set of record types to return, see
+      :class:`.RecordReader`.
+    :param since: Optional time in seconds since the epoch.  Each file
+      is positioned at its first event at or after this time with
+      :func:`.seek_time`.
+    :param until: Optional time in seconds since the epoch.  Reading
+      stops at the first event at or after this time.
 
     Example::
 
@@ -557,10 +2368,40 @@ class FileRecordReader(object):
 
     """
 
-    def __init__(self, *files):
+    def __init__(self, *files, **kwargs):
+        self.buffer_size = kwargs.get("buffer_size")
+        self.use_mmap = kwargs.get("use_mmap", False)
+        self.zero_copy = kwargs.get("zero_copy", False)
+        self.decoders = kwargs.get("decoders")
+        self.types = kwargs.get("types")
+        self.since = kwargs.get("since")
+        self.until = kwargs.get("until")
+        self.done = False
         self.files = list(files)
-        self.fileobj = open(self.files.pop(0), "rb")
-        self.reader = RecordReader(self.fileobj)
+        self.fileobj = None
+        self.reader = None
+        self.open_file(self.files.pop(0))
+        self.indexes = {}
+
+    def open_file(self, filename, offset=None):
+        """Open filename for reading, at offset if given, otherwise at
+        the first event at or after since if set."""
+        if self.fileobj:
+            self.reader.close()
+            self.fileobj.close()
+        self.fileobj = open(filename, "rb")
+        if offset is not None:
+            self.fileobj.seek(offset)
+        elif self.since is not None:
+            seek_time(self.fileobj, self.since)
+        self.reader = self.open_reader()
+
+    def open_reader(self):
+        if self.use_mmap and MMAP_AVAILABLE:
+            return MmapRecordReader(
+                self.fileobj, self.zero_copy, self.decoders, self.types)
+        return RecordReader(
+            self.fileobj, self.buffer_size, self.decoders, self.types)
 
     def next(self):
         """Return the next record or None if EOF.
@@ -569,28 +2410,133 @@ class FileRecordReader(object):
         :class:`.Packet`, :class:`.ExtraData` or :class:`.Unknown` if the
         record is of an unknown type.
         """
+        if self.done:
+            return
         while 1:
             record = self.reader.next()
             if record:
+                if self.until is not None and \
+                   isinstance(record, EVENT_CLASSES) and \
+                   record["event-second"] >= self.until:
+                    self.done = True
+                    return
                 return record
             if not self.files:
                 return
-            self.fileobj.close()
-            self.fileobj = open(self.files.pop(0), "rb")
-            self.reader = RecordReader(self.fileobj)
+            self.open_file(self.files.pop(0))
 
     def tell(self):
         """ Returns the current filename and offset. """
-        return self.fileobj.name, self.fileobj.tell()
+        return self.fileobj.name, self.reader.tell()
+
+    def get_index(self, filename):
+        """Get the up to date :class:`.Unified2Index` for filename,
+        building or updating its sidecar file as needed."""
+        if filename not in self.indexes:
+            self.indexes[filename] = Unified2Index(filename)
+        index = self.indexes[filename]
+        index.update()
+        return index
+
+    def _seek_index(self, find):
+        """Seek to the offset returned by find for the index of the
+        current file or, failing that, the first of the remaining
+        files it returns an offset for."""
+        filenames = [self.fileobj.name] + self.files
+        for i, filename in enumerate(filenames):
+            offset = find(self.get_index(filename))
+            if offset is None:
+                continue
+            if i > 0:
+                self.open_file(filename, offset)
+                self.files = filenames[i + 1:]
+            else:
+                self.reader.seek(offset)
+            self.done = False
+            return True
+        return False
+
+    def seek_event(self, event_id, sensor_id=None):
+        """Seek to an event record by event-id, and optionally
+        sensor-id, using the sidecar index of each file.  The current
+        file is searched from its start, then the remaining files.
+
+        :returns: True if the event was found, otherwise False and
+          the position is unchanged.
+        """
+        return self._seek_index(
+            lambda index: index.find_event(event_id, sensor_id))
+
+    def seek_time(self, seconds):
+        """Seek to the first event record with an event-second at or
+        after seconds, using the sidecar index of each file.  The
+        current file is searched from its start, then the remaining
+        files.
+
+        :returns: True if an event was found, otherwise False and the
+          position is unchanged.
+        """
+        return self._seek_index(lambda index: index.find_time(seconds))
 
     def __iter__(self):
         return iter(self.next, None)
 
+def read_file_events(filename, **kwargs):
+    """Read and aggregate all the events of a single file.
+
+    Keyword arguments are passed to :class:`.FileRecordReader`.
+
+    :returns: A tuple of the records found before the first event
+      record, which belong to the last event of the previous file, and
+      a list of the events in the file.  The last event may still have
+      records in the next file.
+    """
+    leading = []
+    events = []
+    aggregator = Aggregator()
+    for record in FileRecordReader(filename, **kwargs):
+        if not aggregator.queue and not isinstance(record, EVENT_CLASSES):
+            leading.append(record)
+        else:
+            event = aggregator.add(record)
+            if event:
+                events.append(event)
+    event = aggregator.flush()
+    if event:
+        events.append(event)
+    return leading, events
+
+def _read_file_events_job(job):
+    index, filename, kwargs = job
+    leading, events = read_file_events(filename, **kwargs)
+    return index, leading, events
+
 class FileEventReader(object):
     """FileEventReader reads records from one or more filenames and
     aggregates them into events.
 
     :param files...: One or more files to read events from.
+    :param workers: Optional number of processes to decode files in
+      parallel.  Each file is read and aggregated as a whole in a
+      worker process, so this is meant for reprocessing archives of
+      closed files.  Records at the start of a file that belong to the
+      last event of the previous file are still aggregated into it.
+    :param ordered: In parallel mode, whether events are returned in
+      file order (the default).  If False, events are returned as
+      soon as their file has been decoded, which keeps all workers
+      busy.
+    :param aggregator: Optional aggregator to use, such as a
+      :class:`.KeyedAggregator`.  Defaults to an :class:`.Aggregator`.
+      Not used with workers.
+    :param prefetch: Optional number of records to read ahead on a
+      background thread with a :class:`.PrefetchReader`, so reading
+      overlaps with processing the events.  Not used with workers.
+      Call :meth:`.close` when done to stop the thread.
+
+    Other keyword arguments are passed through to the underlying
+    :class:`.FileRecordReader`.  If *types* is given, event records
+    are always read, so for example ``types=[unified2.EXTRA_DATA]``
+    skips packet records.  *zero_copy* can not be used with workers.
 
     Example::
 
@@ -601,12 +2547,104 @@ class FileEventReader(object):
 
     """
 
-    def __init__(self, *files):
-        self.reader = FileRecordReader(*files)
-        self.aggregator = Aggregator()
+    def __init__(self, *files, **kwargs):
+        workers = kwargs.pop("workers", None)
+        ordered = kwargs.pop("ordered", True)
+        prefetch = kwargs.pop("prefetch", None)
+        self.aggregator = kwargs.pop("aggregator", None) or Aggregator()
+        if kwargs.get("types") is not None:
+            kwargs["types"] = EVENT_TYPES.union(kwargs["types"])
+        self.pool = None
+        if workers:
+            self.reader = None
+            self.pool = multiprocessing.Pool(workers)
+            self.events = self._parallel_events(files, kwargs, ordered)
+        else:
+            self.reader = FileRecordReader(*files, **kwargs)
+            if prefetch:
+                self.reader = PrefetchReader(self.reader, prefetch)
+
+    def _parallel_events(self, files, kwargs, ordered):
+        jobs = [(index, filename, kwargs)
+                for index, filename in enumerate(files)]
+        if ordered:
+            results = self.pool.imap(_read_file_events_job, jobs)
+        else:
+            results = self.pool.imap_unordered(_read_file_events_job, jobs)
+
+        # The last event of each file is held back until the records
+        # leading the next file are known.  Files are resolved in
+        # order, the carried event being the last event seen so far.
+        pending = {}
+        next_index = 0
+        carry = None
+
+        for index, leading, events in results:
+            if events and not ordered:
+                for event in events[:-1]:
+                    yield event
+                events = events[-1:]
+            pending[index] = (leading, events)
+
+            while next_index in pending:
+                leading, events = pending.pop(next_index)
+                next_index += 1
+                if leading:
+                    if carry is None:
+                        LOG.warn("Discarding non-event type while not in "
+                                 "event context.")
+                    else:
+                        carry = self._attach(carry, leading)
+                if events:
+                    if carry is not None:
+                        yield carry
+                    for event in events[:-1]:
+                        yield event
+                    carry = events[-1]
+
+        if carry is not None:
+            yield carry
+        self.close()
+
+    def _attach(self, event, records):
+        aggregator = Aggregator()
+        aggregator.add(event)
+        for record in records:
+            aggregator.add(record)
+        return aggregator.flush()
+
+    def seek_event(self, event_id, sensor_id=None):
+        """Seek to an event by event-id using sidecar indexes, see
+        :meth:`.FileRecordReader.seek_event`.  Not available with
+        workers."""
+        if self.reader.seek_event(event_id, sensor_id):
+            self.aggregator.clear()
+            return True
+        return False
+
+    def seek_time(self, seconds):
+        """Seek to the first event at or after seconds using sidecar
+        indexes, see :meth:`.FileRecordReader.seek_time`.  Not
+        available with workers."""
+        if self.reader.seek_time(seconds):
+            self.aggregator.clear()
+            return True
+        return False
+
+    def close(self):
+        """Shut down the worker processes or prefetch thread, if
+        any."""
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if isinstance(self.reader, PrefetchReader):
+            self.reader.close()
 
     def next(self):
         """Return the next :class:`.Event` or None if EOF."""
+        if self.reader is None:
+            return next(self.events, None)
         while 1:
             record = self.reader.next()
             if not record:
@@ -619,6 +2657,97 @@ class FileEventReader(object):
     def __iter__(self):
         return iter(self.next, None)
 
+# Polling interval for following spool directories when inotify is not
+# available.
+POLL_INTERVAL = 0.01
+
+# Longest time to wait for a change notification before checking a
+# spool directory anyway.
+MAX_WAIT = 1.0
+
+# A cached directory listing is only trusted once it was taken this
+# many seconds after the directory was last modified, as on some
+# filesystems the modification time only has a resolution of seconds.
+MTIME_RESOLUTION = 1.0
+
+class DirectoryWaiter(object):
+    """DirectoryWaiter waits for files in a directory to be created or
+    written to.  Linux inotify is used if available, otherwise the
+    wait is a short sleep.
+
+    :param directory: The directory to watch, or a list of directories.
+    :param poll_interval: How long to sleep for when inotify is not
+      available.
+
+    The watch is set up on the first call to :meth:`.wait`, which
+    returns right away so the caller checks for data again.  After
+    that, a change made between checking for data and waiting wakes
+    the next wait.
+    """
+
+    def __init__(self, directory, poll_interval=POLL_INTERVAL):
+        if isinstance(directory, (list, tuple)):
+            self.directories = list(directory)
+        else:
+            self.directories = [directory]
+        self.poll_interval = poll_interval
+        self.inotify = None
+        self.watching = False
+
+    def watch(self):
+        """Set up the watch.  Changes made before this are not seen,
+        so check for data again after calling it."""
+        self.watching = True
+        if not inotify.is_available():
+            LOG.debug("inotify not available, polling %s",
+                      ", ".join(self.directories))
+            return
+        try:
+            self.inotify = inotify.Inotify()
+            for directory in self.directories:
+                self.inotify.add_watch(
+                    directory, inotify.IN_MODIFY | inotify.IN_CREATE |
+                    inotify.IN_MOVED_TO | inotify.IN_CLOSE_WRITE)
+        except OSError as err:
+            LOG.warning("Failed to watch %s, will poll: %s",
+                        ", ".join(self.directories), err)
+            self.close()
+
+    def wait(self, timeout=MAX_WAIT):
+        """Wait up to timeout seconds for a change in the directory.
+
+        :returns: True if a change was seen, or False if the timeout
+          expired or changes can't be seen and the wait was a sleep.
+        """
+        if not self.watching:
+            self.watch()
+            return True
+        if self.inotify is None:
+            time.sleep(min(self.poll_interval, timeout))
+            return False
+        return len(self.inotify.read_events(timeout)) > 0
+
+    def fileno(self):
+        """Return the file descriptor that becomes readable when the
+        directory changes, for use with select or an event loop, or
+        None if changes can't be seen and the directory must be
+        polled.  Call :meth:`.drain` once it is readable."""
+        if self.inotify is None:
+            return None
+        return self.inotify.fileno()
+
+    def drain(self):
+        """Discard the change notifications that have arrived, without
+        waiting."""
+        if self.inotify is not None:
+            self.inotify.read_events(0)
+
+    def close(self):
+        """Stop watching the directory."""
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
 class SpoolRecordReader(object):
     """SpoolRecordReader reads and decodes records from a unified2
     spool directory.
@@ -640,6 +2769,31 @@ class SpoolRecordReader(object):
       the first parameter being the filename being closed, the second
       being the filename being opened.
 
+    :param buffer_size: Optional block size for buffered reading, see
+      :class:`.RecordReader`.
+
+    :param use_mmap: If True, files that have been rolled over (every
+      file but the newest one) are read with a
+      :class:`.MmapRecordReader`.  Ignored if :data:`MMAP_AVAILABLE`
+      is False.
+    :param zero_copy: See :class:`.MmapRecordReader`.
+
+    :param decoders: Optional map of decoders, see
+      :class:`.RecordReader`.
+    :param types: Optional set of record types to return, see
+      :class:`.RecordReader`.
+
+    :param since: Optional time in seconds since the epoch to start
+      reading at.  Files are skipped if the timestamp in the name of
+      the file after them shows they were closed before this time,
+      and other files are positioned at their first event at or after
+      it with :func:`.seek_time`.  It is not applied to the initial
+      file when an *init_offset* is given.
+    :param until: Optional time in seconds since the epoch to stop
+      reading at.  Reading stops at the first event at or after this
+      time, or at a file with a timestamp at or after it in its name,
+      after which :attr:`done` is set.
+
     Example with following and rollover deletion::
 
         def rollover_hook(closed, opened):
@@ -654,35 +2808,95 @@ class SpoolRecordReader(object):
     """
 
     def __init__(self, directory, prefix, init_filename=None, init_offset=None,
-                 follow=False, rollover_hook=None):
+                 follow=False, rollover_hook=None, buffer_size=None,
+                 use_mmap=False, zero_copy=False, decoders=None,
+                 types=None, since=None, until=None):
         self.directory = directory
         self.prefix = prefix
         self.follow = follow
         self.rollover_hook = rollover_hook
+        self.buffer_size = buffer_size
+        self.use_mmap = use_mmap
+        self.zero_copy = zero_copy
+        self.decoders = decoders
+        self.types = types
+        self.since = since
+        self.until = until
+        self.done = False
         self.fileobj = None
         self.reader = None
         self.fnfilter = "%s*" % (self.prefix)
+        self.waiter = DirectoryWaiter(directory)
+
+        # The cached directory listing, its sort keys, the directory
+        # modification time it is for and when it was taken.
+        self._filenames = []
+        self._keys = []
+        self._mtime = None
+        self._listed = 0
 
         if init_filename:
             if os.path.exists("%s/%s" % (
                     self.directory, os.path.basename(init_filename))):
-                self.open_file(init_filename)
-                self.fileobj.seek(init_offset)
-                self.reader = RecordReader(self.fileobj)
+                self.open_file(init_filename, init_offset)
 
     def get_filenames(self):
-        """Return the filenames (sorted) from the spool directory."""
-        return sorted(fnmatch.filter(os.listdir(self.directory), self.fnfilter))
+        """Return the filenames from the spool directory, sorted by
+        :func:`.filename_sort_key`.  Sidecar index files, which also
+        start with the prefix, are left out.
 
-    def open_file(self, filename):
+        The listing is cached until the modification time of the
+        directory changes.  The returned list must not be modified.
+        """
+        mtime = os.stat(self.directory).st_mtime
+        if mtime != self._mtime or \
+           self._listed - mtime <= MTIME_RESOLUTION:
+            self._listed = time.time()
+            filenames = [
+                filename for filename in fnmatch.filter(
+                    os.listdir(self.directory), self.fnfilter)
+                if not filename.endswith(INDEX_SUFFIX)]
+            self._keys = sorted(filename_sort_key(f) for f in filenames)
+            self._filenames = [key[2] for key in self._keys]
+            self._mtime = mtime
+        return self._filenames
+
+    def _find(self, filename):
+        """Return the index of filename in the cached listing, or
+        None if it is not there."""
+        key = filename_sort_key(filename)
+        idx = bisect.bisect_left(self._keys, key)
+        if idx < len(self._keys) and self._keys[idx] == key:
+            return idx
+        return None
+
+    def open_reader(self):
+        """Create a record reader for the current file object.  The
+        file is memory mapped if that is enabled and the file has
+        been rolled over."""
+        if self.use_mmap and MMAP_AVAILABLE:
+            filenames = self.get_filenames()
+            if filenames and \
+               os.path.basename(self.fileobj.name) != filenames[-1]:
+                return MmapRecordReader(
+                    self.fileobj, self.zero_copy, self.decoders, self.types)
+        return RecordReader(
+            self.fileobj, self.buffer_size, self.decoders, self.types)
+
+    def open_file(self, filename, offset=None):
         if self.fileobj:
             closed_filename = self.fileobj.name
+            self.reader.close()
             self.fileobj.close()
         else:
             closed_filename = None
         self.fileobj = open("%s/%s" % (
             self.directory, os.path.basename(filename)), "rb")
-        self.reader = RecordReader(self.fileobj)
+        if offset is not None:
+            self.fileobj.seek(offset)
+        elif self.since is not None:
+            seek_time(self.fileobj, self.since)
+        self.reader = self.open_reader()
         if self.rollover_hook:
             self.rollover_hook(closed_filename, self.fileobj.name)
 
@@ -696,28 +2910,43 @@ class SpoolRecordReader(object):
         if not filenames:
             return
 
-        # If we do not have a current fileobj, open the first file.
         if not self.fileobj:
-            self.open_file(filenames[0])
-            return os.path.basename(self.fileobj.name)
-
-        if os.path.basename(self.fileobj.name) not in filenames:
-            # The current file doesn't exist anymore, move on.
-            self.open_file(filenames[0])
-            return os.path.basename(self.fileobj.name)
+            # If we do not have a current fileobj, open the first file.
+            idx = 0
         else:
-            current_idx = filenames.index(os.path.basename(self.fileobj.name))
-            if current_idx + 1 < len(filenames):
-                self.fileobj.close()
-                self.open_file(filenames[current_idx + 1])
-                return os.path.basename(self.fileobj.name)
+            idx = self._find(os.path.basename(self.fileobj.name))
+            if idx is None:
+                # The current file doesn't exist anymore, move on.
+                idx = 0
+            else:
+                idx += 1
+                if idx >= len(filenames):
+                    return
+
+        if self.since is not None:
+            # Skip files that were rolled over before since, as all
+            # their events were written before then.
+            while idx + 1 < len(filenames):
+                timestamp = filename_timestamp(filenames[idx + 1])
+                if timestamp is None or timestamp >= self.since:
+                    break
+                idx += 1
+
+        if self.until is not None:
+            timestamp = filename_timestamp(filenames[idx])
+            if timestamp is not None and timestamp >= self.until:
+                self.done = True
+                return
+
+        self.open_file(filenames[idx])
+        return os.path.basename(self.fileobj.name)
 
     def tell(self):
         """Return a tuple containing the filename and offset of the
         file currently being processed.
         """
         if self.fileobj:
-            return (self.fileobj.name, self.fileobj.tell())
+            return (self.fileobj.name, self.reader.tell())
         return None, None
 
     def _next(self):
@@ -754,23 +2983,333 @@ class SpoolRecordReader(object):
     def next(self):
         """Return the next record or None if EOF.
 
-        If in follow mode and EOF, this method will sleep and
-        and try again.
+        If in follow mode and EOF, this method will wait for the spool
+        directory to change and try again.
 
         :returns: A record of type :class:`.Event`, :class:`.Packet`,
           :class:`.ExtraData` or :class:`.Unknown` if the record is of
           an unknown type.
 
         """
-        while True:
+        while not self.done:
             record = self._next()
             if record:
+                if self.until is not None and \
+                   isinstance(record, EVENT_CLASSES) and \
+                   record["event-second"] >= self.until:
+                    self.done = True
+                    return
                 return record
-            if not self.follow:
+            if not self.follow or self.done:
                 return
             else:
-                # Sleep for a moment and try again.
-                time.sleep(0.01)
+                # Wait for a file to be written to and try again.
+                self.waiter.wait()
+
+    def close(self):
+        """Close the current file and stop watching the directory."""
+        if self.fileobj:
+            self.reader.close()
+            self.fileobj.close()
+            self.fileobj = None
+        self.waiter.close()
+
+    def __iter__(self):
+        return iter(self.next, None)
+
+# The default number of records a PrefetchReader reads ahead.
+PREFETCH_DEPTH = 1024
+
+# The number of records a PrefetchReader thread queues at a time.
+# Queueing records one at a time costs more than decoding them.
+PREFETCH_BATCH = 64
+
+# How often, in seconds, a PrefetchReader thread that is blocked on a
+# full queue or waiting for more data checks if it has been closed.
+PREFETCH_WAIT = 0.1
+
+# The kinds of item queued by a PrefetchReader thread.
+_PREFETCH_RECORD = 0
+_PREFETCH_EOF = 1
+_PREFETCH_ROLLOVER = 2
+_PREFETCH_ERROR = 3
+
+class PrefetchStats(object):
+    """Statistics of a :class:`.PrefetchReader` queue.
+
+    :attr records: The number of records returned.
+    :attr depth: The total number of records read ahead when each
+      record was returned, counting queued batches as full, see
+      :meth:`.mean_depth`.
+    :attr stalls: The number of times a record was asked for and none
+      was queued, so the reader had to wait for the thread.
+    :attr stall_time: The total time spent waiting in stalls, in
+      seconds.
+    :attr full: The number of times the thread found the queue full,
+      meaning reading is ahead of processing.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.depth = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.full = 0
+
+    def mean_depth(self):
+        return float(self.depth) / self.records if self.records else 0.0
+
+    def __str__(self):
+        return "records=%d mean-depth=%.1f stalls=%d (%.3fs) full=%d" % (
+            self.records, self.mean_depth(), self.stalls, self.stall_time,
+            self.full)
+
+class _PrefetchWaiter(object):
+    """Stands in for the :class:`.DirectoryWaiter` of a reader wrapped
+    by a :class:`.PrefetchReader`, as it is the thread that waits on
+    the directory.  Waiting is for records to be queued instead."""
+
+    poll_interval = POLL_INTERVAL
+    watching = True
+
+    def __init__(self, prefetch):
+        self.prefetch = prefetch
+
+    def watch(self):
+        pass
+
+    def wait(self, timeout=MAX_WAIT):
+        return self.prefetch.wait(timeout)
+
+    def fileno(self):
+        return None
+
+    def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+class PrefetchReader(object):
+    """PrefetchReader reads and decodes records from a
+    :class:`.FileRecordReader` or :class:`.SpoolRecordReader` on a
+    background thread, into a bounded queue, so reading from disk
+    overlaps with processing the records.
+
+    :param reader: The record reader to read from.  It must not be
+      used directly once wrapped.
+    :param depth: The maximum number of records to read ahead.
+    :param follow: Set to true if the thread should wait for more
+      data once the end of a spool is reached, for readers that are
+      being followed.  Otherwise the thread stops at the first end of
+      data.  A wrapped reader created with *follow* set is followed
+      by the thread instead, and no longer waits itself.
+
+    Records are queued in batches of up to :data:`PREFETCH_BATCH`,
+    and whatever has been read when the end of data is reached.
+
+    :meth:`.next` and :meth:`.tell` behave as those of the wrapped
+    reader: :meth:`.tell` returns the position after the last record
+    returned rather than how far the thread has read, and the
+    *rollover_hook* of a :class:`.SpoolRecordReader` is called as
+    :meth:`.next` moves onto a new file.  Other attributes are those
+    of the wrapped reader.
+
+    Queue statistics are recorded in :attr:`stats`, a
+    :class:`.PrefetchStats`.
+
+    Example::
+
+        reader = unified2.PrefetchReader(
+            unified2.FileRecordReader("unified2.log.1382627941"))
+        for record in reader:
+            print(record)
+        reader.close()
+
+    """
+
+    def __init__(self, reader, depth=PREFETCH_DEPTH, follow=False):
+        self.reader = reader
+        self.batch_size = max(1, min(depth, PREFETCH_BATCH))
+        self.depth = depth
+        self.follow = follow
+        self.stats = PrefetchStats()
+        self.waiter = _PrefetchWaiter(self)
+
+        # A following reader waits in next() at the end of data, so
+        # the thread could neither queue the records read before it
+        # nor see that it has been stopped.  Follow here instead.
+        if getattr(reader, "follow", False):
+            reader.follow = False
+            self.follow = True
+
+        # Rollovers are queued with the records, so the hook is
+        # called from the thread reading the records.
+        self.rollover_hook = getattr(reader, "rollover_hook", None)
+        if self.rollover_hook:
+            reader.rollover_hook = self._queue_rollover
+
+        self.queue = None
+        self.thread = None
+        self._start()
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
+
+    def _start(self):
+        self.position = self.reader.tell()
+        self.eof = False
+        self.items = collections.deque()
+        self._batch = []
+        self._stop = threading.Event()
+        self.queue = queue.Queue(max(1, self.depth // self.batch_size))
+        self.thread = threading.Thread(
+            target=self._run, args=(self.queue, self._stop))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _stop_thread(self):
+        self._stop.set()
+        self.thread.join()
+
+    def _put(self, batches, stop):
+        batch, self._batch = self._batch, []
+        try:
+            batches.put_nowait(batch)
+            return
+        except queue.Full:
+            self.stats.full += 1
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=PREFETCH_WAIT)
+                return
+            except queue.Full:
+                pass
+
+    def _queue_rollover(self, closed, opened):
+        self._batch.append((_PREFETCH_ROLLOVER, (closed, opened), None))
+
+    def _run(self, batches, stop):
+        # The end of data is only queued once after each run of
+        # records, so a full queue means the reader is ahead.
+        progress = True
+        while not stop.is_set():
+            try:
+                record = self.reader.next()
+            except Exception as err:
+                self._batch.append((_PREFETCH_ERROR, err, None))
+                self._put(batches, stop)
+                return
+            if record is not None:
+                self._batch.append(
+                    (_PREFETCH_RECORD, record, self.reader.tell()))
+                progress = True
+                if len(self._batch) >= self.batch_size:
+                    self._put(batches, stop)
+                continue
+            if progress:
+                self._batch.append((_PREFETCH_EOF, None, None))
+                progress = False
+            if self._batch:
+                self._put(batches, stop)
+            if not self.follow or self.reader.done:
+                return
+            self.reader.waiter.wait(PREFETCH_WAIT)
+
+    def _get(self):
+        """Get the next item, waiting for the thread if none are
+        queued and it has not reached the end of data."""
+        if self.items:
+            return self.items.popleft()
+        try:
+            self.items.extend(self.queue.get_nowait())
+            return self.items.popleft()
+        except queue.Empty:
+            if self.eof:
+                return None
+        self.stats.stalls += 1
+        start = time.time()
+        try:
+            while True:
+                try:
+                    self.items.extend(self.queue.get(timeout=MAX_WAIT))
+                    return self.items.popleft()
+                except queue.Empty:
+                    if not self.thread.is_alive() and self.queue.empty():
+                        return (_PREFETCH_EOF, None, None)
+        finally:
+            self.stats.stall_time += time.time() - start
+
+    def next(self):
+        """Return the next record or None if EOF.  See the *next*
+        method of the wrapped reader."""
+        while True:
+            item = self._get()
+            if item is None:
+                return None
+            kind, value, position = item
+            if kind == _PREFETCH_RECORD:
+                self.eof = False
+                self.position = position
+                self.stats.records += 1
+                self.stats.depth += len(self.items) + \
+                    self.queue.qsize() * self.batch_size
+                return value
+            elif kind == _PREFETCH_ROLLOVER:
+                self.rollover_hook(*value)
+            elif kind == _PREFETCH_EOF:
+                self.eof = True
+                return None
+            else:
+                self.eof = True
+                raise value
+
+    def wait(self, timeout=MAX_WAIT):
+        """Wait up to timeout seconds for the thread to queue more
+        data.
+
+        :returns: True if there is data to read.
+        """
+        if self.items:
+            return True
+        try:
+            self.items.extend(self.queue.get(timeout=timeout))
+        except queue.Empty:
+            return False
+        return True
+
+    @property
+    def done(self):
+        return self.eof and self.reader.done
+
+    def tell(self):
+        """Return the filename and offset after the last record
+        returned."""
+        return self.position
+
+    def _restart(self, seek):
+        self._stop_thread()
+        found = seek()
+        self._start()
+        return found
+
+    def seek_event(self, event_id, sensor_id=None):
+        """See :meth:`.FileRecordReader.seek_event`.  Records read
+        ahead are discarded."""
+        return self._restart(
+            lambda: self.reader.seek_event(event_id, sensor_id))
+
+    def seek_time(self, seconds):
+        """See :meth:`.FileRecordReader.seek_time`.  Records read
+        ahead are discarded."""
+        return self._restart(lambda: self.reader.seek_time(seconds))
+
+    def close(self):
+        """Stop the thread and close the wrapped reader, if it can be
+        closed."""
+        self._stop_thread()
+        if hasattr(self.reader, "close"):
+            self.reader.close()
 
     def __iter__(self):
         return iter(self.next, None)
@@ -789,9 +3328,42 @@ class SpoolEventReader(object):
     :param follow: Set to true to follow the log files.  Reading will
       wait until an event is available before returning.
     :param delete: If True, unified2 files will be deleted when
-      reading has moved onto the next one.
+      reading has moved onto the next one.  Files are deleted on a
+      background thread by a :class:`.RolloverWorker`; one can be
+      passed instead to archive the files.
     :param bookmark: If True, the reader will remember its location and 
       start reading from the bookmarked location on initialization.
+      A :class:`.Unified2Bookmark` can be passed instead to choose
+      how often the bookmark is written.
+    :param buffer_size: Optional block size for buffered reading, see
+      :class:`.RecordReader`.
+    :param use_mmap: Memory map rolled over files, see
+      :class:`.SpoolRecordReader`.
+    :param decoders: Optional map of decoders, see
+      :class:`.RecordReader`.
+    :param types: Optional set of record types to read.  Event records
+      are always read, see :class:`.FileEventReader`.
+    :param since: Optional time to start reading at, see
+      :class:`.SpoolRecordReader`.
+    :param until: Optional time to stop reading at, see
+      :class:`.SpoolRecordReader`.  Following stops once it is
+      reached.
+    :param flush_deadline: Optional number of seconds to wait in
+      follow mode for more records of an event once the end of the
+      spool is reached.  An event is returned when the next event is
+      read or when no record has been added to it for this long.  By
+      default an event is returned as soon as the end of the spool is
+      reached, which may be before all its packets are written.
+    :param aggregator: Optional aggregator to use instead of an
+      :class:`.Aggregator` with *flush_deadline*, such as a
+      :class:`.KeyedAggregator`.
+    :param prefetch: Optional number of records to read ahead on a
+      background thread with a :class:`.PrefetchReader`, so reading
+      overlaps with processing the events.  Call :meth:`.close` when
+      done to stop the thread.
+
+    The latency from the time of each event to it being returned is
+    recorded in :attr:`latency`, a :class:`.LatencyStats`.
 
     Example::
 
@@ -802,16 +3374,35 @@ class SpoolEventReader(object):
     """
 
     def __init__(self, directory, prefix, follow=False, delete=False,
-                 bookmark=False):
+                 bookmark=False, buffer_size=None, use_mmap=False,
+                 decoders=None, types=None, since=None, until=None,
+                 flush_deadline=None, aggregator=None, prefetch=None):
 
         self.follow = follow
+        if isinstance(delete, RolloverWorker):
+            self.rollover_worker = delete
+        elif delete:
+            self.rollover_worker = RolloverWorker()
+        else:
+            self.rollover_worker = None
         self.delete = delete
 
-        self.aggregator = Aggregator()
+        if aggregator is None:
+            aggregator = Aggregator(flush_deadline)
+        self.aggregator = aggregator
+        self.latency = LatencyStats()
+
+        # If only event records are read, an event is complete at the
+        # end of the spool and there is no need to wait.
+        self.events_only = types is not None and EVENT_TYPES.issuperset(types)
  
         self.delete_on_next = []
+        self.rolled_over = False
 
-        if bookmark:
+        if isinstance(bookmark, Unified2Bookmark):
+            self.bookmark = bookmark
+            init_filename, init_offset = self.bookmark.get()
+        elif bookmark:
             self.bookmark = Unified2Bookmark(directory, prefix)
             init_filename, init_offset = self.bookmark.get()
         else:
@@ -823,57 +3414,309 @@ class SpoolEventReader(object):
         # we can flush the aggregator after a timeout.
         self.reader = SpoolRecordReader(
             directory, prefix, init_filename=init_filename,
-            init_offset=init_offset, rollover_hook=self.rollover_hook)
+            init_offset=init_offset, rollover_hook=self.rollover_hook,
+            buffer_size=buffer_size, use_mmap=use_mmap, decoders=decoders,
+            types=None if types is None else EVENT_TYPES.union(types),
+            since=since, until=until)
+        if prefetch:
+            self.reader = PrefetchReader(self.reader, prefetch, follow)
 
     def rollover_hook(self, closed, opened):
         if closed:
             LOG.info("Closed file %s, opened file %s", closed, opened)
         else:
             LOG.info("Opened file %s", opened)
-        if closed and self.delete:
+        if closed and self.rollover_worker:
             self.delete_on_next.append(closed)
+        if closed:
+            self.rolled_over = True
 
-    def next(self):
-        """Return the next :class:`.Event`.
-
-        If in follow mode and EOF is head, this method will sleep and
-        and try again.
+    def read(self):
+        """Read the next event available without waiting for more
+        data, and without updating the bookmark.
 
+        :returns: A tuple of the :class:`.Event` and the mark to pass
+          to :meth:`.acknowledge` once it has been processed.  If no
+          event is available the event is None.
         """
         while True:
 
-            # Get the underlying readers location before we read, as
-            # its the read of the next event that is going to trigger
-            # an event to be assembled.
-            mark = self.reader.tell()
+            # Pass the aggregator the location of each record, so the
+            # mark can be that of the oldest event not yet returned.
+            # Events can still be open when one is returned, and
+            # reading has to resume at the first of them.
+            position = self.reader.tell()
 
             record = self.reader.next()
             if record:
-                event = self.aggregator.add(record)
+                event = self.aggregator.add(record, position)
                 if event:
-                    #return event
-                    break
+                    return event, self.mark()
+            elif self.aggregator.flush_deadline is None or \
+                 self.events_only or not self.follow or self.reader.done:
+                return self.aggregator.flush(), self.mark()
             else:
-                event = self.aggregator.flush()
-                if event or not self.follow:
-                    break
+                return self.aggregator.poll(), self.mark()
+
+    def mark(self):
+        """Return the location to resume reading at: that of the event
+        record of the oldest event not yet returned by :meth:`.read`,
+        or after the last record read if there is none."""
+        position = self.aggregator.tell()
+        if position is None:
+            position = self.reader.tell()
+        return position
+
+    def acknowledge(self, mark):
+        """Record that the events read up to mark, as returned by
+        :meth:`.read`, have been processed.  This updates the bookmark
+        and deletes files that have been read, if enabled.
+        """
+        if self.bookmark and mark[0] is not None:
+            self.bookmark.update(mark[0], mark[1])
+            if self.rolled_over:
+                self.bookmark.commit()
+        self.rolled_over = False
+
+        # Events read ahead may not have been acknowledged yet, and
+        # events may still be open, so keep the file the mark is in
+        # unless it has been read to the end, and the files after it.
+        remaining = []
+        for filename in self.delete_on_next:
+            if remaining or (filename == mark[0] and
+                             mark[1] < os.path.getsize(filename)):
+                remaining.append(filename)
+                continue
+            self.rollover_worker.submit(filename)
+        self.delete_on_next = remaining
+
+    def wait_timeout(self):
+        """Return how long to wait for more data before calling
+        :meth:`.read` again, which is until the deadline of an open
+        event, if there is one."""
+        timeout = self.aggregator.time_left()
+        if timeout is None or timeout > MAX_WAIT:
+            return MAX_WAIT
+        return max(timeout, 0)
 
-                # Sleep for a moment and try again.
-                time.sleep(0.1)
+    def next(self):
+        """Return the next :class:`.Event`.
 
-        while self.delete_on_next:
-            filename = self.delete_on_next.pop()
-            LOG.info("Deleting file %s.", filename)
-            os.unlink(filename)
+        If in follow mode and EOF is hit, this method will wait for
+        the spool directory to change and try again.
 
-        if self.bookmark and mark[0] is not None:
-            self.bookmark.update(mark[0], mark[1])
+        """
+        while True:
+            event, mark = self.read()
+            if event or not self.follow or self.reader.done:
+                break
+
+            # Wait for a file to be written to and try again.
+            self.wait()
+
+        self.acknowledge(mark)
+
+        if event:
+            self.latency.add(event_latency(event))
 
         return event
 
+    def idle(self):
+        """Called when waiting for data, to catch the bookmark up while
+        there is nothing to read."""
+        if self.bookmark:
+            self.bookmark.commit()
+
+    def wait(self, timeout=MAX_WAIT):
+        """Wait for the spool directory to change after :meth:`.read`
+        returned no event, for up to timeout seconds or until the
+        deadline of an open event.  The bookmark is caught up first."""
+        self.idle()
+        self.reader.waiter.wait(min(timeout, self.wait_timeout()))
+
+    @property
+    def done(self):
+        """True once the *until* time has been reached."""
+        return self.reader.done
+
     def tell(self):
         """ See :func:`.SpoolRecordReader.tell`. """
         return self.reader.tell()
 
+    def close(self):
+        """ Write any pending bookmark update, wait for files being
+        deleted or archived, then see :func:`.SpoolRecordReader.close`. """
+        if self.bookmark:
+            self.bookmark.commit()
+        if self.rollover_worker:
+            self.rollover_worker.close()
+        self.reader.close()
+
+    def __iter__(self):
+        return iter(self.next, None)
+
+class MultiSpoolEventReader(object):
+    """MultiSpoolEventReader reads events from several unified2 spool
+    directories at once, such as those of multiple Snort instances on
+    one sensor.
+
+    :param spools: A list of (directory, prefix) tuples, or of
+      :class:`.SpoolEventReader` instances to use for each spool.
+    :param merge: How to merge the events of the spools.  With
+      ``"time"``, the default, the oldest of the next events of the
+      spools is returned first.  With ``"round-robin"``, the spools
+      take turns, which returns each event as soon as it is read.
+    :param follow: Set to true to follow the spools, waiting for an
+      event to be available before returning.
+
+    Other keyword arguments, such as *delete* and *bookmark*, are
+    passed through to the :class:`.SpoolEventReader` created for each
+    spool, so each spool keeps its own bookmark.  To give each spool
+    its own :class:`.Unified2Bookmark`, pass readers instead.
+
+    When following, the time merge only orders the events that are
+    available when an event is returned, so an event written late to
+    one spool may be returned after newer events from another.
+
+    Example::
+
+        reader = unified2.MultiSpoolEventReader(
+            [("/var/log/snort/eth0", "unified2.log"),
+             ("/var/log/snort/eth1", "unified2.log")],
+            follow=True, bookmark=True)
+        for event in reader:
+            print(event)
+
+    """
+
+    def __init__(self, spools, merge="time", follow=False, **kwargs):
+        if merge not in ("time", "round-robin"):
+            raise ValueError("Unknown merge type: %s" % (merge))
+        self.merge = merge
+        self.follow = follow
+        self.readers = []
+        for spool in spools:
+            if not isinstance(spool, SpoolEventReader):
+                directory, prefix = spool
+                spool = SpoolEventReader(
+                    directory, prefix, follow=follow, **kwargs)
+            self.readers.append(spool)
+        self.waiter = DirectoryWaiter(
+            [reader.reader.directory for reader in self.readers])
+        self.prefetch = any(isinstance(reader.reader, PrefetchReader)
+                            for reader in self.readers)
+        self.latency = LatencyStats()
+
+        # For the time merge, a heap of the next event of each spool
+        # with its sort key and mark, and which spools are in it.
+        self.heap = []
+        self.queued = set()
+        self.count = 0
+
+        # For round robin, the spool to try first.
+        self.turn = 0
+
+    def _fill(self):
+        idle = []
+        for index, reader in enumerate(self.readers):
+            if index in self.queued:
+                continue
+            event, mark = reader.read()
+            if event:
+                self.count += 1
+                heapq.heappush(self.heap, (
+                    (event["event-second"], event["event-microsecond"]),
+                    self.count, index, event, mark))
+                self.queued.add(index)
+            else:
+                idle.append((index, mark))
+        return idle
+
+    def _read_time(self):
+        idle = self._fill()
+        if not self.heap:
+            # Every spool was read and had no event.
+            return None, (None, idle)
+        _, _, index, event, mark = heapq.heappop(self.heap)
+        self.queued.discard(index)
+        return event, (index, mark)
+
+    def _read_round_robin(self):
+        idle = []
+        for i in range(len(self.readers)):
+            index = (self.turn + i) % len(self.readers)
+            event, mark = self.readers[index].read()
+            if event:
+                self.turn = index + 1
+                return event, (index, mark)
+            idle.append((index, mark))
+        return None, (None, idle)
+
+    def read(self):
+        """Read the next event available without waiting for more
+        data, and without updating the bookmarks.
+
+        :returns: A tuple of the :class:`.Event` and the mark to pass
+          to :meth:`.acknowledge` once it has been processed.  If no
+          event is available the event is None, and acknowledging the
+          mark moves every spool on as
+          :meth:`.SpoolEventReader.acknowledge` does, deleting files
+          that have been read to the end.
+        """
+        if self.merge == "time":
+            return self._read_time()
+        return self._read_round_robin()
+
+    def acknowledge(self, mark):
+        """Record that the event read with mark has been processed, see
+        :meth:`.SpoolEventReader.acknowledge`."""
+        if mark is None:
+            return
+        index, mark = mark
+        if index is None:
+            for index, idle in mark:
+                self.readers[index].acknowledge(idle)
+        else:
+            self.readers[index].acknowledge(mark)
+
+    def wait(self, timeout=MAX_WAIT):
+        """Wait for any of the spool directories to change after
+        :meth:`.read` returned no event, see
+        :meth:`.SpoolEventReader.wait`."""
+        for reader in self.readers:
+            reader.idle()
+        timeout = min([timeout] + [
+            reader.wait_timeout() for reader in self.readers])
+        if self.prefetch:
+            # A change may be seen before the prefetch thread has
+            # read it, so check the queues again soon.
+            timeout = min(timeout, POLL_INTERVAL)
+        self.waiter.wait(timeout)
+
+    @property
+    def done(self):
+        """True once the *until* time has been reached in every
+        spool."""
+        return all(reader.done for reader in self.readers)
+
+    def next(self):
+        """Return the next :class:`.Event`, or None if no event is
+        available and not following."""
+        while True:
+            event, mark = self.read()
+            self.acknowledge(mark)
+            if event:
+                self.latency.add(event_latency(event))
+                return event
+            if not self.follow or self.done:
+                return None
+            self.wait()
+
+    def close(self):
+        """Close the reader of each spool."""
+        self.waiter.close()
+        for reader in self.readers:
+            reader.close()
+
     def __iter__(self):
         return iter(self.next, None)
@@ -0,0 +1,261 @@
+# Copyright (c) 2013 Jason Ish
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Asyncio versions of the unified2 event readers.
+
+The readers are asynchronous iterators that wait for new data without
+blocking the event loop, and decode events in batches in an executor.
+Requires Python 3.5 or newer.
+
+::
+
+    usage: from idstools import unified2_asyncio
+
+Example::
+
+    async def process(directory):
+        async with unified2_asyncio.AsyncSpoolEventReader(
+                directory, "unified2.log", follow=True,
+                bookmark=True) as reader:
+            async for event in reader:
+                await enrich(event)
+
+"""
+
+import asyncio
+import collections
+
+from idstools import unified2
+
+try:
+    get_running_loop = asyncio.get_running_loop
+except AttributeError:
+    # Before Python 3.7, get_event_loop returns the running loop when
+    # called from a coroutine.
+    get_running_loop = asyncio.get_event_loop
+
+# Default number of events to decode in one executor call.
+BATCH_SIZE = 256
+
+class AsyncEventReader(object):
+    """Base class of the asyncio event readers.  Subclasses provide
+    :meth:`.read_batch`, and optionally :meth:`.acknowledge` and
+    :meth:`.wait`.
+
+    :param executor: Optional executor to decode events in, defaults
+      to the event loop's default executor.
+    :param batch_size: The number of events to decode in each
+      executor call.
+    """
+
+    def __init__(self, executor=None, batch_size=BATCH_SIZE):
+        self.executor = executor
+        self.batch_size = batch_size
+
+        # Decoded events, with their marks, not yet delivered.
+        self.events = collections.deque()
+
+        # The executor call decoding the next batch, kept if the
+        # caller is cancelled so the batch is not lost.
+        self.pending = None
+
+        self.done = False
+
+    def read_batch(self):
+        """Read up to batch_size events, called in the executor.
+
+        :returns: A tuple of a list of (event, mark) tuples, and
+          whether the end of the input has been reached.
+        """
+        raise NotImplementedError()
+
+    def acknowledge(self, mark):
+        """Called on the event loop with the mark of each event as it
+        is delivered, so must not block."""
+        pass
+
+    async def wait(self):
+        """Wait for more data.  Only called if the last batch was empty
+        and the end of the input has not been reached."""
+        pass
+
+    async def next(self):
+        """Return the next :class:`.Event`, or None at the end of the
+        input.
+
+        If cancelled while decoding, the decoded batch is kept for the
+        next call, and as events are only acknowledged when returned,
+        a bookmark is left at the last event returned.
+        """
+        loop = get_running_loop()
+        while not self.events:
+            if self.done:
+                return None
+            if self.pending is None:
+                self.pending = loop.run_in_executor(
+                    self.executor, self.read_batch)
+            events, self.done = await asyncio.shield(self.pending)
+            self.pending = None
+            self.events.extend(events)
+            if not self.events and not self.done:
+                await self.wait()
+        event, mark = self.events.popleft()
+        self.acknowledge(mark)
+        return event
+
+    def close(self):
+        """Close the reader."""
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.next()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.pending is not None:
+            # Let a batch being decoded finish before closing.
+            await asyncio.wait([self.pending])
+        await get_running_loop().run_in_executor(self.executor, self.close)
+
+class AsyncFileEventReader(AsyncEventReader):
+    """Asyncio version of :class:`idstools.unified2.FileEventReader`.
+
+    :param files...: One or more files to read events from.
+
+    The *executor* and *batch_size* keyword arguments are described
+    in :class:`.AsyncEventReader`, other keyword arguments are passed
+    to :class:`idstools.unified2.FileEventReader`.
+    """
+
+    def __init__(self, *files, **kwargs):
+        super(AsyncFileEventReader, self).__init__(
+            kwargs.pop("executor", None),
+            kwargs.pop("batch_size", BATCH_SIZE))
+        self.reader = unified2.FileEventReader(*files, **kwargs)
+
+    def read_batch(self):
+        events = []
+        while len(events) < self.batch_size:
+            event = self.reader.next()
+            if event is None:
+                return events, True
+            events.append((event, None))
+        return events, False
+
+class AsyncSpoolEventReader(AsyncEventReader):
+    """Asyncio version of :class:`idstools.unified2.SpoolEventReader`.
+
+    :param directory: Path to unified2 spool directory.
+    :param prefix: Filename prefix for unified2 log files.
+    :param follow: Set to true to follow the log files, waiting for
+      new data without blocking the event loop.
+
+    The *executor* and *batch_size* keyword arguments are described
+    in :class:`.AsyncEventReader`, other keyword arguments, such as
+    *bookmark* and *delete*, are passed to
+    :class:`idstools.unified2.SpoolEventReader`.
+
+    The marks of delivered events are acknowledged in the executor, so
+    bookmark writes do not block the event loop: before the next batch
+    is read, before waiting for data, and on :meth:`.close`.  Leaving
+    an ``async with`` block closes the reader in the executor.
+    """
+
+    def __init__(self, directory, prefix, follow=False, **kwargs):
+        super(AsyncSpoolEventReader, self).__init__(
+            kwargs.pop("executor", None),
+            kwargs.pop("batch_size", BATCH_SIZE))
+        self.follow = follow
+        self.reader = unified2.SpoolEventReader(
+            directory, prefix, follow=follow, **kwargs)
+        self.waiter = self.reader.reader.waiter
+
+        # The mark of the last event delivered, not yet acknowledged.
+        self.delivered = None
+
+    def flush(self):
+        """Acknowledge the last event delivered, in the executor."""
+        if self.delivered is not None:
+            mark, self.delivered = self.delivered, None
+            self.reader.acknowledge(mark)
+
+    def read_batch(self):
+        self.flush()
+        events = []
+        while len(events) < self.batch_size:
+            event, mark = self.reader.read()
+            if event is None:
+                if not self.follow or self.reader.reader.done:
+                    # Like SpoolEventReader.next, move the bookmark
+                    # past any trailing records once all events have
+                    # been delivered.
+                    events.append((None, mark))
+                    return events, True
+                break
+            events.append((event, mark))
+        return events, False
+
+    def acknowledge(self, mark):
+        self.delivered = mark
+
+    def idle(self):
+        self.flush()
+        self.reader.idle()
+
+    async def wait(self):
+        loop = get_running_loop()
+        await loop.run_in_executor(self.executor, self.idle)
+        if not self.waiter.watching:
+            self.waiter.watch()
+            return
+        timeout = self.reader.wait_timeout()
+        fd = self.waiter.fileno()
+        if fd is None:
+            await asyncio.sleep(min(self.waiter.poll_interval, timeout))
+            return
+        ready = loop.create_future()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(True))
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fd)
+        self.waiter.drain()
+
+    def close(self):
+        """Acknowledge the last event delivered, write any pending
+        bookmark update and close the reader.  This blocks, so call it
+        in an executor from a coroutine."""
+        self.flush()
+        self.reader.close()
@@ -0,0 +1,60 @@
+# Copyright (c) 2013 Jason Ish
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from idstools import inotify
+
+@unittest.skipIf(not inotify.is_available(), "inotify not available")
+class InotifyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.watcher = inotify.Inotify()
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_events(self):
+        wd = self.watcher.add_watch(
+            self.tmpdir, inotify.IN_CREATE | inotify.IN_MODIFY)
+        self.assertEqual(self.watcher.read_events(timeout=0), [])
+
+        with open(os.path.join(self.tmpdir, "test.log"), "wb") as fileobj:
+            fileobj.write(b"test")
+        events = self.watcher.read_events(timeout=1)
+        self.assertEqual(events[0], (wd, inotify.IN_CREATE, 0, b"test.log"))
+        self.assertTrue(inotify.IN_MODIFY in [event[1] for event in events])
+
+    def test_add_watch_error(self):
+        self.assertRaises(
+            OSError, self.watcher.add_watch,
+            os.path.join(self.tmpdir, "missing"), inotify.IN_CREATE)
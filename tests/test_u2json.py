@@ -0,0 +1,267 @@
+# Copyright (c) 2014 Jason Ish
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import print_function
+
+import os
+import json
+import socket
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from idstools import unified2
+from idstools import maps
+from idstools.scripts import u2json
+
+class OutputWrapperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+        self.filename = os.path.join(self.tmpdir, "alerts.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, filename=None):
+        return open(filename or self.filename).read()
+
+    def test_flush_events(self):
+        output = u2json.OutputWrapper(
+            self.filename, flush_events=2, flush_interval=60)
+        self.assertFalse(output.write("one"))
+        self.assertEqual(self.read(), "")
+        self.assertTrue(output.write("two"))
+        self.assertEqual(self.read(), "one\ntwo\n")
+        self.assertEqual(output.events, 2)
+        self.assertEqual(output.latency.count, 1)
+
+    def test_flush_bytes(self):
+        output = u2json.OutputWrapper(
+            self.filename, flush_bytes=8, flush_interval=60)
+        self.assertFalse(output.write("one"))
+        self.assertTrue(output.write("two"))
+        output.write("three")
+        output.close()
+        self.assertEqual(self.read(), "one\ntwo\nthree\n")
+
+    def test_rotation(self):
+        output = u2json.OutputWrapper(self.filename, flush_interval=60)
+        output.write("one")
+        output.flush()
+        os.rename(self.filename, self.filename + ".1")
+        output.write("two")
+        output.flush()
+        self.assertEqual(self.read(self.filename + ".1"), "one\n")
+        self.assertEqual(self.read(), "two\n")
+
+    def test_request_reopen(self):
+        output = u2json.OutputWrapper(self.filename, flush_interval=60)
+        fileobj = output.fileobj
+        output.request_reopen()
+        output.write("one")
+        output.flush()
+        self.assertTrue(fileobj.closed)
+        self.assertEqual(self.read(), "one\n")
+
+class TimestampFormatterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        if not hasattr(time, "tzset"):
+            raise unittest.SkipTest("time.tzset not available")
+        self.tz = os.environ.get("TZ")
+
+    def tearDown(self):
+        if self.tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = self.tz
+        time.tzset()
+
+    def set_tz(self, tz):
+        os.environ["TZ"] = tz
+        time.tzset()
+
+    def test_utc(self):
+        formatter = u2json.TimestampFormatter(utc=True)
+        self.assertEqual(formatter.render(1373924958, 12),
+                         "2013-07-15T21:49:18.000012+0000")
+        self.assertEqual(formatter.render(1373924958, 999999),
+                         "2013-07-15T21:49:18.999999+0000")
+
+    def test_half_hour_offset(self):
+        self.set_tz("Asia/Kolkata")
+        formatter = u2json.TimestampFormatter()
+        self.assertEqual(formatter.render(1373924958, 12),
+                         "2013-07-16T03:19:18.000012+0530")
+
+    def test_dst(self):
+        self.set_tz("America/New_York")
+        formatter = u2json.TimestampFormatter()
+        # Daylight saving time ended at 2013-11-03 06:00:00 UTC.
+        self.assertEqual(formatter.render(1383458399, 0),
+                         "2013-11-03T01:59:59.000000-0400")
+        self.assertEqual(formatter.render(1383458400, 0),
+                         "2013-11-03T01:00:00.000000-0500")
+
+class SuricataJsonFilterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.msgmap = maps.SignatureMap()
+        self.msgmap.load_generator_map(open("tests/gen-msg.map"))
+        self.msgmap.load_signature_map(open("tests/sid-msg.map"))
+        self.classmap = maps.ClassificationMap()
+        self.classmap.load_from_file(open("tests/classification.config"))
+
+    def events(self):
+        for event in unified2.FileEventReader(
+                "tests/merged.log", "tests/multi-record-event.log"):
+            yield event
+            event = dict(event)
+            for protocol in [socket.IPPROTO_UDP, socket.IPPROTO_ICMP,
+                             socket.IPPROTO_ICMPV6, 47]:
+                event["protocol"] = protocol
+                yield dict(event)
+            event["blocked"] = 1
+            event["classification-id"] = 999
+            yield event
+
+    def test_encode(self):
+        """ Test that the template encoding is the same as encoding
+        the filtered event. """
+        self.msgmap.map[(1, 2000001)] = {
+            "gid": 1, "sid": 2000001, "msg": u"Quote \" slash \\ \u00e9"}
+        for output_filter in [
+                u2json.SuricataJsonFilter(),
+                u2json.SuricataJsonFilter(self.msgmap, self.classmap)]:
+            for event in self.events():
+                self.assertEqual(output_filter.encode(event),
+                                 json.dumps(output_filter.filter(event)))
+            event["generator-id"] = 1
+            event["signature-id"] = 2000001
+            self.assertEqual(output_filter.encode(event),
+                             json.dumps(output_filter.filter(event)))
+
+class EncoderPoolTestCase(unittest.TestCase):
+
+    def test_order(self):
+        output_filter = u2json.SuricataJsonFilter()
+        events = list(unified2.FileEventReader(
+            "tests/merged.log", "tests/merged.log"))
+        encoder = u2json.EncoderPool(2, None, None, batch_size=5)
+        try:
+            lines = []
+            marks = []
+            for i, event in enumerate(events):
+                encoder.add(event, i)
+                for batch, batch_marks in encoder.results():
+                    lines += batch
+                    marks += batch_marks
+            for batch, batch_marks in encoder.results(block=True):
+                lines += batch
+                marks += batch_marks
+        finally:
+            encoder.close()
+        self.assertEqual(
+            lines, [output_filter.encode(event) for event in events])
+        self.assertEqual(marks, list(range(len(events))))
+
+class SocketOutputTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+        self.path = os.path.join(self.tmpdir, "sink")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def listen(self, family, address):
+        server = socket.socket(family, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(address)
+        server.listen(1)
+        return server
+
+    def read_lines(self, server):
+        conn, _ = server.accept()
+        try:
+            data = b""
+            while True:
+                buf = conn.recv(4096)
+                if not buf:
+                    return data.decode().splitlines()
+                data += buf
+        finally:
+            conn.close()
+
+    def test_tcp(self):
+        server = self.listen(socket.AF_INET, ("127.0.0.1", 0))
+        output = u2json.open_output(
+            "tcp:127.0.0.1:%d" % (server.getsockname()[1]),
+            flush_events=2, flush_interval=60)
+        self.assertFalse(output.write("one"))
+        self.assertTrue(output.write("two"))
+        output.write("three")
+        output.close()
+        self.assertEqual(self.read_lines(server), ["one", "two", "three"])
+
+    def test_unix_reconnect(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise unittest.SkipTest("Unix sockets not available")
+        output = u2json.open_output("unix:%s" % (self.path))
+        output.retry_min = 0.01
+
+        # Nothing is listening yet, so the first flush waits for it.
+        def listen():
+            time.sleep(0.1)
+            self.server = self.listen(socket.AF_UNIX, self.path)
+        thread = threading.Thread(target=listen)
+        thread.start()
+        output.write("one")
+        output.flush()
+        thread.join()
+        self.assertTrue(output.reconnects > 0)
+
+        # The peer closing the connection is seen before sending.
+        conn, _ = self.server.accept()
+        conn.close()
+        output.write("two")
+        output.close()
+        self.assertEqual(self.read_lines(self.server), ["two"])
+
+    def test_unixgram(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise unittest.SkipTest("Unix sockets not available")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(server.close)
+        server.bind(self.path)
+        output = u2json.open_output(
+            "unixgram:%s" % (self.path), flush_interval=60)
+        for i in range(3):
+            output.write("line %d" % (i))
+        output.close()
+        self.assertEqual(server.recv(65536), b"line 0\nline 1\nline 2\n")
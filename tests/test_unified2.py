@@ -30,6 +30,13 @@ import os.path
 import shutil
 import tempfile
 import io
+import struct
+import json
+import pickle
+import socket
+import threading
+import time
+import gzip
 import logging
 
 try:
@@ -37,6 +44,11 @@ try:
 except:
     import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from idstools import unified2
 
 logging.basicConfig(level=logging.DEBUG)
@@ -88,6 +100,17 @@ class TestReadRecord(unittest.TestCase):
         record = unified2.read_record(fileobj)
         self.assertEqual("207.25.71.28", record["source-ip"])
         self.assertEqual("10.20.11.123", record["destination-ip"])
+        self.assertEqual([], record["packets"])
+        self.assertEqual([], record["extra-data"])
+        self.assertEqual(None, record["appid"])
+
+        for record in unified2.RecordReader(fileobj):
+            if isinstance(record, unified2.Packet):
+                self.assertEqual(record["length"], len(record["data"]))
+            else:
+                self.assertTrue(isinstance(record, unified2.ExtraData))
+                self.assertEqual(
+                    record["data-length"] - 8, len(record["data"]))
 
 class TestRecordReader(unittest.TestCase):
 
@@ -134,6 +157,515 @@ class TestRecordReader(unittest.TestCase):
         records = [r for r in reader]
         self.assertEquals(len(records), 17)
 
+class BufferedRecordReaderTestCase(unittest.TestCase):
+
+    # A unified2 test file containing 1 event consisting of 17 records.
+    test_filename = "tests/multi-record-event.log"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_records(self):
+        """Test that buffered reading gives the same records as
+        unbuffered reading, with block sizes both smaller and larger
+        than the records."""
+        expected = list(unified2.RecordReader(open(self.test_filename, "rb")))
+        for buffer_size in [64, 4096, unified2.BUFFER_SIZE]:
+            reader = unified2.RecordReader(
+                open(self.test_filename, "rb"), buffer_size=buffer_size)
+            records = list(reader)
+            self.assertEqual(len(expected), len(records))
+            for a, b in zip(expected, records):
+                self.assertEqual(type(a), type(b))
+                self.assertEqual(a, b)
+            self.assertEqual(os.path.getsize(self.test_filename), reader.tell())
+
+    def test_short_read_of_body(self):
+        buf = open(self.test_filename, "rb").read(12)
+        fileobj = io.BytesIO(buf)
+        reader = unified2.RecordReader(fileobj, buffer_size=4096)
+        self.assertRaises(EOFError, reader.next)
+        self.assertEqual(fileobj.tell(), 0)
+        self.assertEqual(reader.tell(), 0)
+
+    def test_growing_file(self):
+        filename = "%s/unified2.log.0001" % (self.tmpdir)
+        buf = open(self.test_filename, "rb").read()
+
+        # Start with a file ending in a partial record.
+        open(filename, "ab").write(buf + buf[:30])
+
+        reader = unified2.RecordReader(open(filename, "rb"), buffer_size=4096)
+        for i in range(17):
+            self.assertTrue(reader.next() is not None)
+        self.assertRaises(EOFError, reader.next)
+        self.assertEqual(len(buf), reader.tell())
+
+        # Complete the record, and add another event.
+        open(filename, "ab").write(buf[30:] + buf)
+        for i in range(34):
+            self.assertTrue(reader.next() is not None)
+        self.assertTrue(reader.next() is None)
+        self.assertEqual(len(buf) * 3, reader.tell())
+
+@unittest.skipIf(not unified2.MMAP_AVAILABLE, "mmap memoryview not available")
+class MmapRecordReaderTestCase(unittest.TestCase):
+
+    # A unified2 test file containing 1 event consisting of 17 records.
+    test_filename = "tests/multi-record-event.log"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_records(self):
+        expected = list(unified2.RecordReader(open(self.test_filename, "rb")))
+        reader = unified2.MmapRecordReader(open(self.test_filename, "rb"))
+        records = list(reader)
+        self.assertEqual(expected, records)
+        self.assertEqual(os.path.getsize(self.test_filename), reader.tell())
+        reader.close()
+
+    def test_zero_copy(self):
+        expected = list(unified2.RecordReader(open(self.test_filename, "rb")))
+        reader = unified2.MmapRecordReader(
+            open(self.test_filename, "rb"), zero_copy=True)
+        records = list(reader)
+        for a, b in zip(expected, records):
+            if isinstance(b, unified2.Packet):
+                self.assertTrue(isinstance(b["data"], memoryview))
+                self.assertEqual(a["data"], b["data"].tobytes())
+
+        # Closing with views outstanding must not fail.
+        reader.close()
+        self.assertEqual(
+            expected[-1]["data"], records[-1]["data"].tobytes())
+
+    def test_growing_file(self):
+        filename = "%s/unified2.log.0001" % (self.tmpdir)
+        buf = open(self.test_filename, "rb").read()
+        open(filename, "ab").write(buf + buf[:30])
+
+        reader = unified2.MmapRecordReader(open(filename, "rb"))
+        for i in range(17):
+            self.assertTrue(reader.next() is not None)
+        self.assertRaises(EOFError, reader.next)
+        self.assertEqual(len(buf), reader.tell())
+
+        open(filename, "ab").write(buf[30:])
+        self.assertEqual(17, len(list(reader)))
+        self.assertEqual(None, reader.next())
+
+    def test_empty_file(self):
+        filename = "%s/unified2.log.0001" % (self.tmpdir)
+        open(filename, "wb").close()
+        reader = unified2.MmapRecordReader(open(filename, "rb"))
+        self.assertEqual(None, reader.next())
+
+class AddressCacheTestCase(unittest.TestCase):
+
+    def test_render(self):
+        cache = unified2.AddressCache()
+        self.assertEquals(
+            cache.render(socket.inet_aton("10.16.1.11")), "10.16.1.11")
+        addr = b"\x20\x01\x0d\xb8" + b"\x00" * 11 + b"\x01"
+        self.assertEquals(cache.render(addr), "2001:db8::1")
+        self.assertEquals(unified2._inet6_ntop(addr), "2001:db8::1")
+        self.assertEquals(cache.render(addr), "2001:db8::1")
+        self.assertEquals((cache.hits, cache.misses), (1, 2))
+        self.assertEquals(cache.hit_rate(), 1 / 3.0)
+
+    def test_lru(self):
+        cache = unified2.AddressCache(size=2)
+        a, b, c = [socket.inet_aton("10.0.0.%d" % i) for i in range(3)]
+        cache.render(a)
+        cache.render(b)
+        cache.render(a)
+        cache.render(c)
+        self.assertEquals(list(cache.cache), [a, c])
+        cache.clear()
+        self.assertEquals((len(cache.cache), cache.hits, cache.misses),
+                          (0, 0, 0))
+
+    def test_evicted_by_other_thread(self):
+        cache = unified2.AddressCache(size=2)
+        a = socket.inet_aton("10.0.0.1")
+        cache.render(a)
+
+        # Evict the address between it being looked up and moved to
+        # the end, as another thread could.
+        touch = cache._touch
+        def evict(addr):
+            cache.cache.clear()
+            touch(addr)
+        cache._touch = evict
+        self.assertEquals(cache.render(a), "10.0.0.1")
+        self.assertEquals(list(cache.cache), [a])
+
+    def test_threads(self):
+        cache = unified2.AddressCache(size=8)
+        addrs = [socket.inet_aton("10.0.0.%d" % i) for i in range(16)]
+        errors = []
+        def render():
+            try:
+                for i in range(2000):
+                    for addr in addrs:
+                        cache.render(addr)
+            except Exception as err:
+                errors.append(err)
+        threads = [threading.Thread(target=render) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(errors, [])
+        self.assertTrue(len(cache.cache) <= 8)
+
+    def test_event_ip6(self):
+        decoder = unified2.EventDecoder(
+            unified2.EVENT_IP6_V2_FIELDS, unified2.AddressCache())
+        values = [0] * len(decoder.keys)
+        values[decoder.keys.index("source-ip")] = \
+            b"\xfe\x80" + b"\x00" * 13 + b"\x01"
+        values[decoder.keys.index("destination-ip")] = b"\x00" * 16
+        event = decoder.decode(decoder.struct.pack(*values))
+        self.assertEquals(event["source-ip"], "fe80::1")
+        self.assertEquals(event["destination-ip"], "::")
+        self.assertEquals(decoder.address_cache.misses, 2)
+
+class LazyEventTestCase(unittest.TestCase):
+
+    test_filename = "tests/merged.log"
+
+    def test_same_as_event(self):
+        expected = [r for r in unified2.RecordReader(
+            open(self.test_filename, "rb"))
+                    if isinstance(r, unified2.Event)]
+        events = [r for r in unified2.RecordReader(
+            open(self.test_filename, "rb"),
+            decoders=unified2.LAZY_DECODERS)
+                  if isinstance(r, unified2.Event)]
+        self.assertEqual(len(expected), len(events))
+        for a, b in zip(expected, events):
+            self.assertTrue(isinstance(b, unified2.LazyEvent))
+            self.assertEqual(a, b)
+            self.assertEqual(json.dumps(a, sort_keys=True),
+                             json.dumps(b, sort_keys=True))
+
+    def test_field_access(self):
+        event = unified2.RecordReader(
+            open(self.test_filename, "rb"),
+            decoders=unified2.LAZY_DECODERS).next()
+
+        # Only the fields up to the priority are decoded yet.
+        self.assertTrue(dict.__contains__(event, "priority"))
+        self.assertFalse(dict.__contains__(event, "source-ip"))
+        self.assertFalse(dict.__contains__(event, "protocol"))
+        self.assertTrue("destination-ip" in event)
+
+        self.assertEqual(498, event["signature-id"])
+        self.assertFalse(dict.__contains__(event, "source-ip"))
+
+        # Accessing one of the rest decodes them all.
+        self.assertEqual("172.16.1.10", event.get("source-ip"))
+        self.assertTrue(dict.__contains__(event, "destination-ip"))
+        self.assertTrue(dict.__contains__(event, "protocol"))
+        self.assertTrue("destination-ip" in event)
+        self.assertEqual(None, event.get("nonexistent"))
+        self.assertRaises(KeyError, lambda: event["nonexistent"])
+
+        copy = pickle.loads(pickle.dumps(event))
+        self.assertTrue(type(copy) is unified2.Event)
+        self.assertEqual(event, copy)
+
+    def test_aggregation(self):
+        reader = unified2.FileEventReader(
+            "tests/multi-record-event.log", decoders=unified2.LAZY_DECODERS)
+        event = reader.next()
+        self.assertTrue(isinstance(event, unified2.LazyEvent))
+        self.assertEqual(15, len(event["packets"]))
+        self.assertEqual(1, len(event["extra-data"]))
+
+class CompactRecordTestCase(unittest.TestCase):
+
+    test_filename = "tests/multi-record-event.log"
+
+    def test_same_as_dict_records(self):
+        expected = list(unified2.RecordReader(open("tests/merged.log", "rb")))
+        records = list(unified2.RecordReader(
+            open("tests/merged.log", "rb"),
+            decoders=unified2.COMPACT_DECODERS))
+        self.assertEqual(len(expected), len(records))
+        for a, b in zip(expected, records):
+            self.assertTrue(isinstance(b, unified2.CompactRecord))
+            self.assertEqual(a, b.to_dict())
+            self.assertEqual(type(a), type(b.to_dict()))
+
+    def test_access(self):
+        event = unified2.RecordReader(
+            open("tests/merged.log", "rb"),
+            decoders=unified2.COMPACT_DECODERS).next()
+        self.assertEqual(498, event.signature_id)
+        self.assertEqual(498, event["signature-id"])
+        self.assertEqual("172.16.1.10", event.source_ip)
+        self.assertEqual(None, event.get("nonexistent"))
+        self.assertRaises(KeyError, lambda: event["nonexistent"])
+        self.assertEqual((), event.packets)
+        self.assertFalse(hasattr(event, "__dict__"))
+
+    def test_aggregation(self):
+        reader = unified2.FileEventReader(
+            self.test_filename, decoders=unified2.COMPACT_DECODERS)
+        event = reader.next()
+        self.assertTrue(isinstance(event, unified2.CompactEvent))
+        self.assertEqual(15, len(event.packets))
+        self.assertEqual(1, len(event.extra_data))
+
+        expected = unified2.FileEventReader(self.test_filename).next()
+        self.assertEqual(expected, event.to_dict())
+
+class RecordTypeFilterTestCase(unittest.TestCase):
+
+    # A unified2 test file containing 1 event consisting of 17 records.
+    test_filename = "tests/multi-record-event.log"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def readers(self, fileobj, types):
+        yield unified2.RecordReader(fileobj, types=types)
+        fileobj.seek(0)
+        yield unified2.RecordReader(fileobj, buffer_size=64, types=types)
+        fileobj.seek(0)
+        yield unified2.RecordReader(fileobj, buffer_size=4096, types=types)
+        if unified2.MMAP_AVAILABLE:
+            fileobj.seek(0)
+            yield unified2.MmapRecordReader(fileobj, types=types)
+
+    def test_types(self):
+        fileobj = open(self.test_filename, "rb")
+        for reader in self.readers(fileobj, [unified2.EXTRA_DATA]):
+            records = list(reader)
+            self.assertEqual(1, len(records))
+            self.assertTrue(isinstance(records[0], unified2.ExtraData))
+            self.assertEqual(os.path.getsize(self.test_filename), reader.tell())
+
+    def test_skip_partial_record(self):
+        filename = "%s/unified2.log.0001" % (self.tmpdir)
+        buf = open(self.test_filename, "rb").read()
+
+        # End the file part way through the second record, a packet.
+        open(filename, "wb").write(buf[0:100])
+
+        fileobj = open(filename, "rb")
+        for reader in self.readers(fileobj, unified2.EVENT_TYPES):
+            self.assertTrue(isinstance(reader.next(), unified2.Event))
+            self.assertRaises(EOFError, reader.next)
+            self.assertEqual(68, reader.tell())
+
+        open(filename, "ab").write(buf[100:] + buf)
+        fileobj = open(filename, "rb")
+        for reader in self.readers(fileobj, unified2.EVENT_TYPES):
+            self.assertEqual(2, len(list(reader)))
+
+    def test_event_reader(self):
+        reader = unified2.FileEventReader(self.test_filename, types=[])
+        event = reader.next()
+        self.assertEqual([], event["packets"])
+        self.assertEqual([], event["extra-data"])
+
+@unittest.skipIf(numpy is None, "numpy not available")
+class EventArraysTestCase(unittest.TestCase):
+
+    def test_read_event_arrays(self):
+        filenames = ["tests/merged.log", "tests/multi-record-event.log"]
+        expected = [event for event in unified2.FileRecordReader(*filenames)
+                    if isinstance(event, unified2.Event)]
+
+        arrays = unified2.read_event_arrays(filenames)
+        self.assertEqual([unified2.EVENT_V2], list(arrays.keys()))
+        events = arrays[unified2.EVENT_V2]
+        self.assertEqual(len(expected), len(events))
+        for a, b in zip(expected, events):
+            self.assertEqual(a["signature-id"], b["signature-id"])
+            self.assertEqual(a["event-second"], b["event-second"])
+            self.assertEqual(a["vlan-id"], b["vlan-id"])
+            self.assertEqual(
+                a["source-ip"], socket.inet_ntoa(b["source-ip"]))
+
+    def test_dtype(self):
+        for fields in [unified2.EVENT_FIELDS, unified2.EVENT_IP6_V2_FIELDS]:
+            self.assertEqual(
+                unified2.AbstractDecoder(fields).struct.size,
+                unified2.numpy_dtype(fields).itemsize)
+
+class Unified2IndexTestCase(unittest.TestCase):
+
+    test_filename = "tests/merged.log"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "merged.log")
+        self.buf = open(self.test_filename, "rb").read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_index(self):
+        open(self.filename, "wb").write(self.buf)
+        index = unified2.Unified2Index(self.filename)
+        self.assertEquals(index.update(), 6)
+        self.assertTrue(os.path.exists(self.filename + ".idx"))
+        self.assertEquals(index.offset, len(self.buf))
+        self.assertEquals(
+            [entry[2] for entry in index.entries], [1, 2, 3, 4, 5, 6])
+
+        # The offsets point at the event records.
+        fileobj = open(self.filename, "rb")
+        fileobj.seek(index.find_event(4))
+        event = unified2.read_record(fileobj)
+        self.assertEquals(event["event-id"], 4)
+        fileobj.seek(index.find_time(1373924959))
+        self.assertEquals(unified2.read_record(fileobj)["event-id"], 4)
+        self.assertEquals(index.find_time(1373924960), None)
+        self.assertEquals(index.find_event(4, sensor_id=1), None)
+
+        # A new instance loads the sidecar.
+        index = unified2.Unified2Index(self.filename)
+        index.load()
+        self.assertEquals(len(index.entries), 6)
+        self.assertEquals(index.update(), 0)
+
+    def test_incremental(self):
+        # Write up to the middle of the 4th event record.
+        fileobj = open(self.filename, "wb")
+        entries = unified2.Unified2Index(self.test_filename).scan()
+        fileobj.write(self.buf[:entries[3][0] + 20])
+        fileobj.flush()
+
+        index = unified2.Unified2Index(self.filename)
+        self.assertEquals(index.update(), 3)
+        self.assertEquals(index.offset, entries[3][0])
+
+        fileobj.write(self.buf[entries[3][0] + 20:])
+        fileobj.close()
+
+        index = unified2.Unified2Index(self.filename)
+        self.assertEquals(index.update(), 3)
+        self.assertEquals(index.entries, entries)
+
+    def test_index_in_spool(self):
+        """ Test that an index next to a spool file is not read as a
+        spool file. """
+        filename = os.path.join(self.tmpdir, "unified2.log.0001")
+        open(filename, "wb").write(self.buf)
+        self.assertTrue(unified2.FileRecordReader(filename).seek_event(2))
+        self.assertTrue(os.path.exists(filename + ".idx"))
+        reader = unified2.SpoolEventReader(self.tmpdir, "unified2.log")
+        self.assertEquals(
+            [event["event-id"] for event in reader], [1, 2, 3, 4, 5, 6])
+        reader.close()
+
+def write_timed_log(filename, copies, start=1000):
+    """Write a unified2 file of copies of tests/merged.log, with
+    event-ids counting up from 1 and 3 events per second from start.
+
+    Returns a list of the (event-id, event-second) of the events.
+    """
+    buf = open("tests/merged.log", "rb").read()
+    records = []
+    offset = 0
+    while offset < len(buf):
+        rtype, rlen = struct.unpack(">LL", buf[offset:offset + 8])
+        records.append((rtype, buf[offset:offset + 8 + rlen]))
+        offset += 8 + rlen
+    events = []
+    with open(filename, "wb") as fileobj:
+        for _ in range(copies):
+            for rtype, record in records:
+                if rtype in unified2.EVENT_TYPES:
+                    event_id = len(events) + 1
+                    second = start + len(events) // 3
+                    events.append((event_id, second))
+                    record = record[:12] + struct.pack(
+                        ">LL", event_id, second) + record[20:]
+                fileobj.write(record)
+    return events
+
+class SeekTimeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "unified2.log.1000")
+        self.events = write_timed_log(self.filename, 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_seek(self):
+        fileobj = open(self.filename, "rb")
+        for seconds in [0, 1000, 1001, 1057, 1150, 1199]:
+            expected = [e for e in self.events if e[1] >= seconds][0]
+            offset = unified2.seek_time(fileobj, seconds)
+            self.assertEquals(fileobj.tell(), offset)
+            record = unified2.read_record(fileobj)
+            self.assertEquals(record["event-id"], expected[0])
+        self.assertEquals(unified2.seek_time(fileobj, 1200), None)
+        self.assertEquals(unified2.read_record(fileobj), None)
+
+    def test_seek_time(self):
+        self.assertTrue(os.path.getsize(self.filename) > 4 *
+                        unified2.SEEK_SCAN_LEN)
+        self.check_seek()
+
+    def test_seek_time_index(self):
+        unified2.Unified2Index(self.filename).update()
+        self.check_seek()
+
+    def test_find_record_header(self):
+        buf = open(self.filename, "rb").read()
+        offsets = []
+        offset = 0
+        while offset < len(buf):
+            offsets.append(offset)
+            offset += 8 + struct.unpack(">LL", buf[offset:offset + 8])[1]
+        fileobj = open(self.filename, "rb")
+        for offset in [1, 100, 5000, 150000]:
+            found = unified2.find_record_header(fileobj, offset)
+            self.assertEquals(found, [o for o in offsets if o >= offset][0])
+
+    def test_file_reader(self):
+        reader = unified2.FileEventReader(
+            self.filename, since=1100, until=1110)
+        events = [(e["event-id"], e["event-second"]) for e in reader]
+        self.assertEquals(
+            events, [e for e in self.events if 1100 <= e[1] < 1110])
+
+    def test_spool_reader(self):
+        write_timed_log(
+            os.path.join(self.tmpdir, "unified2.log.1200"), 100, 1200)
+        write_timed_log(
+            os.path.join(self.tmpdir, "unified2.log.1400"), 100, 1400)
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2.log", since=1250, until=1260, follow=True)
+        opened = []
+        def rollover_hook(closed, filename):
+            opened.append(os.path.basename(filename))
+        reader.reader.rollover_hook = rollover_hook
+        events = [e["event-second"] for e in reader]
+        self.assertEquals(events, sorted(
+            [s for s in range(1250, 1260)] * 3))
+        self.assertEquals(opened, ["unified2.log.1200"])
+        self.assertTrue(reader.reader.done)
+
 class FileRecordReaderTest(unittest.TestCase):
 
     # A unified2 test file containing 1 event consisting of 17 records.
@@ -178,6 +710,37 @@ class FileRecordReaderTest(unittest.TestCase):
             self.assertTrue(reader.next() is not None)
         self.assertTrue(reader.next() is None)
 
+    @unittest.skipIf(not unified2.MMAP_AVAILABLE,
+                     "mmap memoryview not available")
+    def test_mmap(self):
+        reader = unified2.FileRecordReader(
+            self.test_filename, self.test_filename, use_mmap=True)
+        self.assertTrue(isinstance(reader.reader, unified2.MmapRecordReader))
+        self.assertEqual(34, len(list(reader)))
+
+    def test_mmap_unavailable(self):
+        """Test that use_mmap falls back to buffered reading where
+        memory maps can not be read, as on Python 2."""
+        available = unified2.MMAP_AVAILABLE
+        unified2.MMAP_AVAILABLE = False
+        try:
+            reader = unified2.FileRecordReader(
+                self.test_filename, self.test_filename, use_mmap=True)
+            self.assertFalse(
+                isinstance(reader.reader, unified2.MmapRecordReader))
+            self.assertEqual(34, len(list(reader)))
+            self.assertRaises(
+                NotImplementedError, unified2.MmapRecordReader,
+                open(self.test_filename, "rb"))
+        finally:
+            unified2.MMAP_AVAILABLE = available
+
+    def test_buffered_tell(self):
+        reader = unified2.FileRecordReader(
+            self.test_filename, buffer_size=unified2.BUFFER_SIZE)
+        reader.next()
+        self.assertEqual((self.test_filename, 68), reader.tell())
+
 class AggregatorTestCase(unittest.TestCase):
 
     # A unified2 test file containing 1 event consisting of 17 records.
@@ -210,6 +773,96 @@ class AggregatorTestCase(unittest.TestCase):
         self.assertTrue(event)
         self.assertTrue(isinstance(event, unified2.Event))
 
+    def test_poll(self):
+        aggregator = unified2.Aggregator(flush_deadline=1)
+        self.assertEqual(aggregator.time_left(), None)
+        self.assertEqual(aggregator.poll(), None)
+
+        reader = unified2.RecordReader(open(self.test_filename, "rb"))
+        for record in reader:
+            aggregator.add(record)
+        now = aggregator.updated
+        self.assertEqual(aggregator.time_left(now + 0.25), 0.75)
+        self.assertEqual(aggregator.poll(now + 0.5), None)
+        event = aggregator.poll(now + 1)
+        self.assertEqual(len(event["packets"]), 15)
+        self.assertEqual(aggregator.time_left(), None)
+
+class KeyedAggregatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # merged.log has 6 events, each followed by a packet.
+        self.records = list(
+            unified2.RecordReader(open("tests/merged.log", "rb")))
+        self.events = self.records[0::2]
+        self.packets = self.records[1::2]
+
+    def test_interleaved(self):
+        aggregator = unified2.KeyedAggregator()
+        for record in [self.events[0], self.events[1], self.packets[1],
+                       self.packets[0], self.events[2], self.packets[2]]:
+            self.assertEqual(aggregator.add(record), None)
+        events = list(iter(aggregator.flush, None))
+        self.assertEqual([e["event-id"] for e in events], [1, 2, 3])
+        for event in events:
+            self.assertEqual(len(event["packets"]), 1)
+            self.assertEqual(
+                event["packets"][0]["event-id"], event["event-id"])
+
+    def test_compact(self):
+        records = list(unified2.RecordReader(
+            open("tests/merged.log", "rb"),
+            decoders=unified2.COMPACT_DECODERS))
+        aggregator = unified2.KeyedAggregator()
+        for record in [records[0], records[2], records[3], records[1]]:
+            aggregator.add(record)
+        events = list(iter(aggregator.flush, None))
+        self.assertEqual([len(e.packets) for e in events], [1, 1])
+
+    def test_evict(self):
+        aggregator = unified2.KeyedAggregator(max_events=1)
+        aggregator.add(self.events[0])
+        event = aggregator.add(self.events[1])
+        self.assertEqual(event["event-id"], 1)
+        self.assertEqual(aggregator.evicted, 1)
+        self.assertEqual(aggregator.add(self.packets[0]), None)
+        self.assertEqual(aggregator.orphaned, 1)
+        self.assertEqual(aggregator.flush()["packets"], [])
+
+    def test_poll(self):
+        aggregator = unified2.KeyedAggregator(flush_deadline=1)
+        aggregator.add(self.events[0])
+        aggregator.add(self.events[1])
+        now = time.time()
+        self.assertEqual(aggregator.poll(now), None)
+        self.assertEqual(aggregator.poll(now + 1)["event-id"], 1)
+        self.assertEqual(aggregator.poll(now + 1)["event-id"], 2)
+        self.assertEqual(aggregator.expired, 2)
+        self.assertEqual(aggregator.poll(now + 1), None)
+
+    def test_reused_event_id(self):
+        aggregator = unified2.KeyedAggregator()
+        aggregator.add(self.events[0], 0)
+        aggregator.add(self.events[1], 1)
+        aggregator.add(self.events[2], 2)
+        self.assertEqual(aggregator.tell(), 0)
+
+        # Reusing event-id 2 completes events 1 and 2, in order.
+        self.assertEqual(aggregator.add(self.events[1], 3)["event-id"], 1)
+        self.assertEqual(aggregator.tell(), 1)
+        self.assertEqual(aggregator.flush()["event-id"], 2)
+        self.assertEqual(aggregator.tell(), 2)
+        self.assertEqual(
+            [e["event-id"] for e in iter(aggregator.flush, None)], [3, 2])
+        self.assertEqual(aggregator.tell(), None)
+
+    def test_file_event_reader(self):
+        reader = unified2.FileEventReader(
+            "tests/merged.log", aggregator=unified2.KeyedAggregator())
+        events = list(reader)
+        self.assertEqual([e["event-id"] for e in events], [1, 2, 3, 4, 5, 6])
+        self.assertEqual([len(e["packets"]) for e in events], [1] * 6)
+
 class FileEventReaderTestCase(unittest.TestCase):
 
     # A unified2 test file containing 1 event consisting of 17 records.
@@ -236,6 +889,157 @@ class FileEventReaderTestCase(unittest.TestCase):
             self.test_filename, self.test_filename)
         self.assertEquals(len(list(reader)), 2)
 
+    def test_seek(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filenames = []
+            for i in range(2):
+                filename = os.path.join(tmpdir, "merged.log.%d" % (i))
+                shutil.copy("tests/merged.log", filename)
+                filenames.append(filename)
+            reader = unified2.FileEventReader(*filenames)
+            self.assertTrue(reader.seek_event(5))
+            self.assertEquals(reader.next()["event-id"], 5)
+            self.assertEquals(reader.next()["event-id"], 6)
+            self.assertFalse(reader.seek_event(7))
+            self.assertEquals(reader.next()["event-id"], 1)
+            self.assertEquals(reader.reader.tell()[0], filenames[1])
+            self.assertTrue(reader.seek_time(1373924959))
+            self.assertEquals(reader.next()["event-id"], 4)
+            self.assertTrue(os.path.exists(filenames[1] + ".idx"))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_workers(self):
+        """ Test parallel reading, including an event that straddles
+        a file boundary. """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            buf = open(self.test_filename, "rb").read()
+            # Split the event after its first packet record.
+            split = 0
+            for _ in range(2):
+                split += 8 + struct.unpack(">LL", buf[split:split + 8])[1]
+            filenames = []
+            for i, part in enumerate([buf, buf[:split], buf[split:], buf]):
+                filename = os.path.join(tmpdir, "unified2.log.%d" % (i))
+                open(filename, "wb").write(part)
+                filenames.append(filename)
+
+            expected = list(unified2.FileEventReader(*filenames))
+            self.assertEquals(len(expected), 3)
+
+            for ordered in [True, False]:
+                reader = unified2.FileEventReader(
+                    *filenames, workers=2, ordered=ordered)
+                events = list(reader)
+                self.assertEquals(len(events), 3)
+                for event in events:
+                    self.assertEquals(len(event["packets"]), 15)
+                    self.assertEquals(len(event["extra-data"]), 1)
+                if ordered:
+                    self.assertEquals(events, expected)
+                self.assertEquals(reader.pool, None)
+        finally:
+            shutil.rmtree(tmpdir)
+
+class PrefetchReaderTestCase(unittest.TestCase):
+
+    test_filename = "tests/multi-record-event.log"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_records(self):
+        expected = []
+        reader = unified2.FileRecordReader(
+            self.test_filename, self.test_filename)
+        for record in reader:
+            expected.append((record, reader.tell()))
+
+        reader = unified2.PrefetchReader(unified2.FileRecordReader(
+            self.test_filename, self.test_filename), depth=2)
+        records = []
+        for record in reader:
+            records.append((record, reader.tell()))
+        self.assertEquals(records, expected)
+        self.assertTrue(reader.next() is None)
+        self.assertTrue(reader.done is False)
+        self.assertEquals(reader.stats.records, 34)
+        reader.close()
+        self.assertFalse(reader.thread.is_alive())
+
+    def test_file_event_reader(self):
+        shutil.copy("tests/merged.log", "%s/merged.log" % (self.tmpdir))
+        reader = unified2.FileEventReader(
+            "%s/merged.log" % (self.tmpdir), prefetch=4)
+        try:
+            self.assertTrue(reader.seek_event(5))
+            self.assertEquals(reader.next()["event-id"], 5)
+            self.assertTrue(reader.seek_time(1373924959))
+            self.assertEquals(reader.next()["event-id"], 4)
+        finally:
+            reader.close()
+
+    def test_spool_event_reader(self):
+        """ Test that rollover deletion and bookmarking follow the
+        events returned, not the records read ahead. """
+        for i in range(2):
+            shutil.copy(self.test_filename,
+                        "%s/unified2.log.%04d" % (self.tmpdir, i))
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2", bookmark=True, delete=True,
+            prefetch=64)
+        try:
+            self.assertTrue(isinstance(reader.next(), unified2.Event))
+            self.assertEquals(
+                reader.bookmark.get(), ("unified2.log.0000", 38950))
+            self.assertTrue(os.path.exists(
+                "%s/unified2.log.0001" % (self.tmpdir)))
+            self.assertTrue(isinstance(reader.next(), unified2.Event))
+            self.assertTrue(reader.next() is None)
+            self.assertEquals(
+                reader.bookmark.get(), ("unified2.log.0001", 38950))
+            reader.rollover_worker.join()
+            self.assertFalse(os.path.exists(
+                "%s/unified2.log.0000" % (self.tmpdir)))
+        finally:
+            reader.close()
+
+    def test_following_reader(self):
+        """ Test that a following reader with less than a batch of
+        records is read from, and can be closed. """
+        shutil.copy("tests/merged.log", "%s/unified2.log.0001" % self.tmpdir)
+        reader = unified2.PrefetchReader(unified2.SpoolRecordReader(
+            self.tmpdir, "unified2", follow=True))
+        try:
+            self.assertTrue(reader.follow)
+            self.assertEquals(len(list(reader)), 12)
+        finally:
+            thread = threading.Thread(target=reader.close)
+            thread.daemon = True
+            thread.start()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_follow(self):
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2", follow=True, prefetch=64)
+        def write():
+            time.sleep(0.2)
+            shutil.copy(
+                self.test_filename, "%s/unified2.log.1382627900" % self.tmpdir)
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            self.assertTrue(isinstance(reader.next(), unified2.Event))
+        finally:
+            thread.join()
+            reader.close()
+
 class SpoolRecordReaderTestCase(unittest.TestCase):
 
     test_filename = "tests/multi-record-event.log"
@@ -260,6 +1064,25 @@ class SpoolRecordReaderTestCase(unittest.TestCase):
         for filename in filenames:
             self.assertTrue(filename.startswith("unified2.log"))
 
+    def test_get_filenames_sorted_by_timestamp(self):
+        for suffix in ["999", "1000", "20"]:
+            open("%s/unified2.log.%s" % (self.tmpdir, suffix), "wb").close()
+        reader = unified2.SpoolRecordReader(self.tmpdir, "unified2")
+        self.assertEqual(reader.get_filenames(), [
+            "unified2.log.20", "unified2.log.999", "unified2.log.1000"])
+
+    def test_get_filenames_cached(self):
+        shutil.copy("tests/merged.log", "%s/unified2.log.0001" % (self.tmpdir))
+        os.utime(self.tmpdir, (1000, 1000))
+        reader = unified2.SpoolRecordReader(self.tmpdir, "unified2")
+        filenames = reader.get_filenames()
+        self.assertTrue(reader.get_filenames() is filenames)
+
+        # Adding a file updates the modification time of the directory.
+        shutil.copy("tests/merged.log", "%s/unified2.log.0002" % (self.tmpdir))
+        self.assertEqual(reader.get_filenames(),
+                         ["unified2.log.0001", "unified2.log.0002"])
+
     def test_open_next(self):
 
         reader = unified2.SpoolRecordReader(self.tmpdir, "unified2")
@@ -346,6 +1169,24 @@ class SpoolRecordReaderTestCase(unittest.TestCase):
             self.assertTrue(reader.next() is not None)
         self.assertTrue(reader.next() is None)
 
+    @unittest.skipIf(not unified2.MMAP_AVAILABLE,
+                     "mmap memoryview not available")
+    def test_mmap_rolled_over_files(self):
+        shutil.copy(self.test_filename, "%s/unified2.log.0001" % (self.tmpdir))
+        shutil.copy(self.test_filename, "%s/unified2.log.0002" % (self.tmpdir))
+
+        reader = unified2.SpoolRecordReader(
+            self.tmpdir, "unified2", use_mmap=True)
+        self.assertTrue(reader.next() is not None)
+        self.assertTrue(isinstance(reader.reader, unified2.MmapRecordReader))
+        for i in range(17):
+            self.assertTrue(reader.next() is not None)
+
+        # The newest file is still being written to, so should not be
+        # memory mapped.
+        self.assertFalse(isinstance(reader.reader, unified2.MmapRecordReader))
+        self.assertEqual(16, len(list(reader)))
+
     def test_iteration(self):
 
         test_filename = "tests/multi-record-event.log"
@@ -392,6 +1233,63 @@ class SpoolEventReaderTestCase(unittest.TestCase):
         self.assertTrue(isinstance(reader.next(), unified2.Event))
         self.assertTrue(reader.next() is None)
 
+    def test_follow(self):
+        """ Test that following wakes up for a new file. """
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2", follow=True)
+        reader.reader.waiter.poll_interval = 60
+        def write():
+            time.sleep(0.2)
+            shutil.copy(
+                self.test_filename, "%s/unified2.log.1382627900" % self.tmpdir)
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            self.assertTrue(isinstance(reader.next(), unified2.Event))
+        finally:
+            thread.join()
+            reader.close()
+
+    def test_flush_deadline(self):
+        """ Test that following with a flush deadline waits for the
+        rest of an event being written. """
+        buf = open(self.test_filename, "rb").read()
+        filename = "%s/unified2.log.1382627900" % self.tmpdir
+        # The event record and its first packet.
+        split = 0
+        for _ in range(2):
+            split += 8 + struct.unpack(">LL", buf[split:split + 8])[1]
+        fileobj = open(filename, "wb")
+        fileobj.write(buf[:split])
+        fileobj.flush()
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2", follow=True, flush_deadline=0.5)
+        def write():
+            time.sleep(0.2)
+            fileobj.write(buf[split:])
+            fileobj.close()
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            event = reader.next()
+            self.assertEqual(len(event["packets"]), 15)
+            self.assertEqual(len(event["extra-data"]), 1)
+            self.assertEqual(reader.latency.count, 1)
+        finally:
+            thread.join()
+            reader.close()
+
+    def test_waiter(self):
+        waiter = unified2.DirectoryWaiter(self.tmpdir)
+        self.assertTrue(waiter.wait())
+        if waiter.inotify is None:
+            self.skipTest("inotify not available")
+        self.assertFalse(waiter.wait(timeout=0))
+        shutil.copy(
+            self.test_filename, "%s/unified2.log.1382627900" % self.tmpdir)
+        self.assertTrue(waiter.wait(timeout=1))
+        waiter.close()
+
     def rollover_hook(self, closed, opened):
         print("Closed: %s; Opened: %s." % (closed, opened))
 
@@ -474,3 +1372,226 @@ class SpoolEventReaderTestCase(unittest.TestCase):
         self.assertEquals(
             bookmark_filename, os.path.basename(underlying_filename))
         self.assertEquals(bookmark_offset, underlying_offset)
+
+    def test_bookmark_keyed_aggregator(self):
+        """Test that the bookmark stays at the oldest open event of a
+        KeyedAggregator, so no events are lost when reading resumes,
+        even across a rollover."""
+        for i in range(2):
+            shutil.copy("tests/merged.log",
+                        "%s/unified2.log.%04d" % (self.tmpdir, i))
+
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2", bookmark=True, delete=True,
+            aggregator=unified2.KeyedAggregator(max_events=3))
+        event_ids = [reader.next()["event-id"] for _ in range(4)]
+        reader.rollover_worker.join()
+
+        # Events 5 and 6 of the first file are still open.
+        self.assertEqual(event_ids, [1, 2, 3, 4])
+        self.assertEqual(
+            reader.bookmark.get()[0], "unified2.log.0000")
+        self.assertTrue(os.path.exists(
+            "%s/unified2.log.0000" % (self.tmpdir)))
+
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2", bookmark=True,
+            aggregator=unified2.KeyedAggregator(max_events=3))
+        event_ids += [event["event-id"] for event in reader]
+        self.assertEqual(event_ids, [1, 2, 3, 4, 5, 6] * 2)
+
+class Unified2BookmarkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_commit_every(self):
+        bookmark = unified2.Unified2Bookmark(
+            self.tmpdir, "unified2", commit_every=3)
+        bookmark.update("unified2.log.0001", 10)
+        bookmark.update("unified2.log.0001", 20)
+        self.assertEqual(bookmark.get(), (None, None))
+        bookmark.update("/spool/unified2.log.0001", 30)
+        self.assertEqual(bookmark.get(), ("unified2.log.0001", 30))
+        self.assertEqual(
+            os.listdir(self.tmpdir), ["_unified2.bookmark"])
+
+    def test_commit_interval(self):
+        bookmark = unified2.Unified2Bookmark(
+            self.tmpdir, "unified2", commit_every=None, commit_interval=60,
+            fsync=True)
+        bookmark.update("unified2.log.0001", 10)
+        self.assertEqual(bookmark.get(), (None, None))
+        bookmark.commit_time -= 60
+        bookmark.update("unified2.log.0001", 20)
+        self.assertEqual(bookmark.get(), ("unified2.log.0001", 20))
+        bookmark.update("unified2.log.0002", 30)
+        bookmark.commit()
+        self.assertEqual(bookmark.get(), ("unified2.log.0002", 30))
+
+    def test_commit_on_rollover(self):
+        for i in range(2):
+            shutil.copy("tests/multi-record-event.log",
+                        "%s/unified2.log.%04d" % (self.tmpdir, i))
+        bookmark = unified2.Unified2Bookmark(
+            self.tmpdir, "unified2", commit_every=None)
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2", bookmark=bookmark, delete=True)
+
+        # The first event is completed by reading the second file.
+        self.assertTrue(reader.next())
+        self.assertEqual(bookmark.get(), ("unified2.log.0000", 38950))
+        reader.rollover_worker.join()
+        self.assertFalse(os.path.exists(
+            "%s/unified2.log.0000" % (self.tmpdir)))
+
+        self.assertTrue(reader.next())
+        self.assertEqual(bookmark.get(), ("unified2.log.0000", 38950))
+        reader.close()
+        self.assertEqual(bookmark.get(), ("unified2.log.0001", 38950))
+
+class RolloverWorkerTestCase(unittest.TestCase):
+
+    test_filename = "tests/multi-record-event.log"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+        self.archive_dir = os.path.join(self.tmpdir, "archive")
+        os.mkdir(self.archive_dir)
+        self.filename = os.path.join(self.tmpdir, "unified2.log.0000")
+        shutil.copy(self.test_filename, self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_delete(self):
+        worker = unified2.RolloverWorker()
+        worker.submit(self.filename)
+        worker.close()
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertEqual(worker.completed, 1)
+
+    def test_delete_index(self):
+        unified2.Unified2Index(self.filename).update()
+        other = os.path.join(self.tmpdir, "unified2.log.0001")
+        shutil.copy(self.test_filename, other)
+        worker = unified2.RolloverWorker()
+        worker.submit(self.filename)
+        worker.submit(other)
+        worker.close()
+        self.assertEqual(os.listdir(self.tmpdir), ["archive"])
+        self.assertEqual(worker.completed, 2)
+
+    def test_archive(self):
+        worker = unified2.RolloverWorker(self.archive_dir)
+        worker.submit(self.filename)
+        worker.join()
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertEqual(
+            open(os.path.join(self.archive_dir, "unified2.log.0000"),
+                 "rb").read(),
+            open(self.test_filename, "rb").read())
+
+        # A file of the same name, such as from another spool, is
+        # archived with a suffix, with its index.
+        shutil.copy(self.test_filename, self.filename)
+        unified2.Unified2Index(self.filename).update()
+        worker.submit(self.filename)
+        worker.close()
+        self.assertEqual(os.listdir(self.tmpdir), ["archive"])
+        self.assertEqual(sorted(os.listdir(self.archive_dir)), [
+            "unified2.log.0000", "unified2.log.0000.1",
+            "unified2.log.0000.1.idx"])
+        self.assertEqual(worker.failed, 0)
+
+    def test_compress(self):
+        unified2.Unified2Index(self.filename).update()
+        worker = unified2.RolloverWorker(self.archive_dir, compress=True)
+        worker.submit(self.filename)
+        worker.close()
+        self.assertEqual(os.listdir(self.tmpdir), ["archive"])
+        self.assertEqual(os.listdir(self.archive_dir),
+                         ["unified2.log.0000.gz"])
+        self.assertEqual(
+            gzip.open(os.path.join(
+                self.archive_dir, "unified2.log.0000.gz")).read(),
+            open(self.test_filename, "rb").read())
+
+    def test_spool_event_reader(self):
+        shutil.copy(self.test_filename,
+                    os.path.join(self.tmpdir, "unified2.log.0001"))
+        reader = unified2.SpoolEventReader(
+            self.tmpdir, "unified2",
+            delete=unified2.RolloverWorker(self.archive_dir, compress=True))
+        self.assertEqual(len(list(reader)), 2)
+        reader.close()
+        self.assertEqual(os.listdir(self.archive_dir),
+                         ["unified2.log.0000.gz"])
+
+class MultiSpoolEventReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+        self.spools = []
+        for i in range(2):
+            directory = os.path.join(self.tmpdir, "spool%d" % (i))
+            os.mkdir(directory)
+            # 6 events in each spool, 3 per second, the second spool
+            # starting a second later.
+            write_timed_log(
+                os.path.join(directory, "unified2.log.1000"), 1, 1000 + i)
+            self.spools.append((directory, "unified2.log"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_time_merge(self):
+        reader = unified2.MultiSpoolEventReader(self.spools)
+        events = [(e["event-second"], e["event-microsecond"])
+                  for e in reader]
+        self.assertEqual(len(events), 12)
+        self.assertEqual(events, sorted(events))
+        self.assertEqual(reader.latency.count, 12)
+
+    def test_round_robin(self):
+        reader = unified2.MultiSpoolEventReader(
+            self.spools, merge="round-robin")
+        events = [e["event-second"] for e in reader]
+        self.assertEqual(events[:4], [1000, 1001, 1000, 1001])
+        self.assertEqual(len(events), 12)
+
+    def test_bookmark(self):
+        reader = unified2.MultiSpoolEventReader(self.spools, bookmark=True)
+        for _ in range(7):
+            self.assertTrue(reader.next())
+        reader.close()
+        reader = unified2.MultiSpoolEventReader(self.spools, bookmark=True)
+        self.assertEqual(len(list(reader)), 5)
+        for directory, _ in self.spools:
+            self.assertTrue(os.path.exists(
+                os.path.join(directory, "_unified2.log.bookmark")))
+
+    def test_delete_idle(self):
+        """Test that a file is deleted once a quiet spool rolls over,
+        without waiting for an event in the new file."""
+        for merge in ("time", "round-robin"):
+            for directory, _ in self.spools:
+                write_timed_log(
+                    os.path.join(directory, "unified2.log.1000"), 1, 1000)
+            reader = unified2.MultiSpoolEventReader(
+                self.spools, merge=merge, delete=True)
+            self.assertEqual(len(list(reader)), 12)
+            directory = self.spools[0][0]
+            open(os.path.join(directory, "unified2.log.1001"), "wb").close()
+            self.assertEqual(reader.next(), None)
+            reader.close()
+            self.assertEqual(os.listdir(directory), ["unified2.log.1001"])
+            os.unlink(os.path.join(directory, "unified2.log.1001"))
+
+    def test_bad_merge(self):
+        self.assertRaises(
+            ValueError, unified2.MultiSpoolEventReader, self.spools,
+            merge="random")
@@ -0,0 +1,125 @@
+# Copyright (c) 2013 Jason Ish
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING
+# IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Test cases for idstools.unified2_asyncio, in their own module as
+the coroutines are a syntax error before Python 3.5.  Imported by
+test_unified2_asyncio."""
+
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from idstools import unified2
+from idstools import unified2_asyncio
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+class AsyncFileEventReaderTestCase(unittest.TestCase):
+
+    def test_iteration(self):
+        async def read():
+            reader = unified2_asyncio.AsyncFileEventReader(
+                "tests/merged.log", "tests/merged.log", batch_size=4)
+            return [event["event-id"] async for event in reader]
+        self.assertEqual(run(read()), [1, 2, 3, 4, 5, 6] * 2)
+
+class AsyncSpoolEventReaderTestCase(unittest.TestCase):
+
+    test_filename = "tests/multi-record-event.log"
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="idstools-test.")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_iteration(self):
+        shutil.copy("tests/merged.log", "%s/unified2.log.0001" % self.tmpdir)
+        async def read():
+            async with unified2_asyncio.AsyncSpoolEventReader(
+                    self.tmpdir, "unified2", bookmark=True) as reader:
+                return [event["event-id"] async for event in reader]
+        self.assertEqual(run(read()), [1, 2, 3, 4, 5, 6])
+        bookmark = unified2.Unified2Bookmark(self.tmpdir, "unified2")
+        self.assertEqual(bookmark.get(), ("unified2.log.0001", 2862))
+
+    def test_follow(self):
+        def write():
+            time.sleep(0.2)
+            shutil.copy(
+                self.test_filename, "%s/unified2.log.0001" % self.tmpdir)
+        async def read():
+            reader = unified2_asyncio.AsyncSpoolEventReader(
+                self.tmpdir, "unified2", follow=True)
+            ticks = 0
+            task = asyncio.ensure_future(reader.next())
+            while not task.done():
+                # The loop keeps running while the reader waits.
+                ticks += 1
+                await asyncio.sleep(0.01)
+            reader.close()
+            return task.result(), ticks
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            event, ticks = run(read())
+        finally:
+            thread.join()
+        self.assertEqual(len(event["packets"]), 15)
+        self.assertTrue(ticks > 5)
+
+    def test_cancel(self):
+        shutil.copy("tests/merged.log", "%s/unified2.log.0001" % self.tmpdir)
+        async def read():
+            reader = unified2_asyncio.AsyncSpoolEventReader(
+                self.tmpdir, "unified2", bookmark=True, batch_size=1)
+            first = await reader.next()
+            task = asyncio.ensure_future(reader.next())
+            await asyncio.sleep(0)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # The first event is acknowledged in the executor, as the
+            # batch the cancelled call started is read.
+            await asyncio.wait([reader.pending])
+            bookmark = reader.reader.bookmark.get()
+            rest = [event["event-id"] async for event in reader]
+            return first["event-id"], bookmark, rest
+        first, bookmark, rest = run(read())
+        self.assertEqual(first, 1)
+        # The bookmark is left after the first event, at the event
+        # record of the second.
+        self.assertEqual(bookmark, ("unified2.log.0001", 477))
+        self.assertEqual(rest, [2, 3, 4, 5, 6])